@@ -0,0 +1,164 @@
+from pandas import DataFrame, Series, Categorical
+from functools import lru_cache
+import numpy as np
+
+# Eurostat age codes, the detailed ones in age order, then the aggregate and UNK. Every code gets a small integer (its position), and the bounds
+# of the ages it covers: [lower, upper) in years, upper None for open-ended codes.
+AGE_BOUNDS: dict[str, tuple[int, int]] = {
+    "Y_LT5": (0, 5), "Y5-9": (5, 10), "Y10-14": (10, 15), "Y15-19": (15, 20), "Y20-24": (20, 25),
+    "Y25-29": (25, 30), "Y30-34": (30, 35), "Y35-39": (35, 40), "Y40-44": (40, 45), "Y45-49": (45, 50),
+    "Y50-54": (50, 55), "Y55-59": (55, 60), "Y60-64": (60, 65), "Y65-69": (65, 70), "Y70-74": (70, 75),
+    "Y75-79": (75, 80), "Y80-84": (80, 85), "Y85-89": (85, 90), "Y_GE90": (90, None),
+    # Aggregate code: the population data has it next to Y85-89 and Y_GE90 for most regions
+    "Y_GE85": (85, None),
+}
+
+AGE_CODES: list[str] = list(AGE_BOUNDS) + ["UNK"]
+
+# Band schemes: tuples of (label, lower, upper) so they can be cached
+SCHEMES: dict[str, tuple[tuple[str, int, int], ...]] = {
+    "broad": (("0-14", 0, 15), ("15-64", 15, 65), ("65+", 65, None)),
+    "elderly": (("0-64", 0, 65), ("65-79", 65, 80), ("80+", 80, None)),
+    "decades": tuple((f"{lower}-{lower + 9}", lower, lower + 10) for lower in range(0, 90, 10)) + (("90+", 90, None),),
+}
+
+
+def encode_ages(ages: Series) -> np.ndarray:
+    """Converts the age strings to their ordered integer code
+
+    Args:
+        ages (Series): Eurostat age codes
+
+    Returns:
+        codes (np.ndarray): position in AGE_CODES, -1 for unknown strings
+    """
+
+    return Categorical(ages, categories=AGE_CODES, ordered=True).codes.astype(np.int8)
+
+
+def add_age_code(data: DataFrame, age_col: str = "age") -> DataFrame:
+    """Adds the ordered integer age code to a clean dataset
+
+    Args:
+        data (DataFrame): clean deaths or population data
+        age_col (str, optional): age column. Defaults to "age".
+
+    Returns:
+        coded_data (DataFrame): the input with an 'age_code' column
+    """
+
+    return data.assign(age_code=encode_ages(data[age_col]))
+
+
+def remove_overlapping_ages(data: DataFrame, group_cols: list[str], age_col: str = "age") -> DataFrame:
+    """Drops the Y_GE85 rows of the groups that also have the detailed Y85-89 row
+
+    Without this, 85+ people are counted twice when the population is summed over ages.
+
+    Args:
+        data (DataFrame): clean data
+        group_cols (list[str]): columns that identify one age distribution, e.g. ["sex", "nuts", "year"]
+        age_col (str, optional): age column. Defaults to "age".
+
+    Returns:
+        data (DataFrame): the rows without the overlapping aggregate
+    """
+
+    is_aggregate: Series = data[age_col] == "Y_GE85"
+    if not is_aggregate.any():
+        return data
+
+    has_detail: Series = (data[age_col] == "Y85-89").groupby([data[col] for col in group_cols]).transform("any")
+
+    return data[~(is_aggregate & has_detail)]
+
+
+@lru_cache(maxsize=None)
+def get_band_lookup(bands: tuple[tuple[str, int, int], ...]) -> np.ndarray:
+    """Lookup array from age code to band index, built once per band scheme
+
+    A code goes to a band only if all its ages fall inside it; codes that straddle two bands and
+    UNK map to -1 and are left out of the aggregation.
+
+    Args:
+        bands (tuple[tuple[str, int, int], ...]): (label, lower, upper) of each band, upper None if open
+
+    Returns:
+        lookup (np.ndarray): band index of every code in AGE_CODES, -1 if it has none
+    """
+
+    lookup: np.ndarray = np.full(len(AGE_CODES), -1, dtype=np.int64)
+
+    for code, (lower, upper) in AGE_BOUNDS.items():
+        for position, (_, band_lower, band_upper) in enumerate(bands):
+            fits_lower: bool = lower >= band_lower
+            fits_upper: bool = band_upper is None or (upper is not None and upper <= band_upper)
+            if fits_lower and fits_upper:
+                lookup[AGE_CODES.index(code)] = position
+                break
+
+    lookup.flags.writeable = False
+
+    return lookup
+
+
+def rebin_ages(data: DataFrame, bands, value_cols: list[str], group_cols: list[str], age_col: str = "age") -> DataFrame:
+    """Aggregates values from the 5-year age codes to custom bands with one bincount per value column
+
+    Y_GE85 rows that duplicate Y85-89 and Y_GE90 are dropped first (see remove_overlapping_ages).
+    The remaining Y_GE85 rows fit a band only if it starts at or below 85 and is open-ended. Under
+    "decades" they straddle 80-89 and 90+, so they are left out and reported. UNK rows are left out too.
+
+    Args:
+        data (DataFrame): clean deaths or population data
+        bands: name of a scheme in SCHEMES or a sequence of (label, lower, upper)
+        value_cols (list[str]): columns to sum, e.g. ["deaths"] or ["population"]
+        group_cols (list[str]): columns kept in the result, e.g. ["nuts", "year"]
+        age_col (str, optional): age column. Defaults to "age".
+
+    Returns:
+        rebinned (DataFrame): one row per group and band, with the summed value columns
+    """
+
+    # Every column that is not an age or a value identifies one age distribution
+    distribution_cols: list[str] = [col for col in data.columns if col not in value_cols + [age_col, "age_code", "is_provisional"]]
+    data = remove_overlapping_ages(data, distribution_cols, age_col)
+
+    scheme: tuple[tuple[str, int, int], ...] = SCHEMES[bands] if isinstance(bands, str) else tuple(tuple(band) for band in bands)
+    lookup: np.ndarray = get_band_lookup(scheme)
+    n_bands: int = len(scheme)
+
+    codes: np.ndarray = data["age_code"].to_numpy() if "age_code" in data.columns else encode_ages(data[age_col])
+    band: np.ndarray = np.where(codes >= 0, lookup[codes], -1)
+
+    # Known codes that straddle two bands (e.g. a Y_GE85 row without detail under "decades") are left out
+    straddling: np.ndarray = (codes >= 0) & (codes != AGE_CODES.index("UNK")) & (band < 0)
+    if straddling.any():
+        left_out: str = ", ".join(f"{data[col].to_numpy(dtype=np.float64, na_value=0.0)[straddling].sum():g} {col}" for col in value_cols)
+        straddling_codes: str = ", ".join(sorted(set(data[age_col].to_numpy()[straddling])))
+        print(f"# {straddling.sum()} rows of {straddling_codes} straddle two bands and are left out ({left_out})")
+
+    if group_cols:
+        grouping = data.groupby(group_cols, sort=True, dropna=False)
+        group_id: np.ndarray = grouping.ngroup().to_numpy()
+        keys: DataFrame = grouping.size().index.to_frame(index=False)
+    else:
+        group_id = np.zeros(len(data), dtype=np.int64)
+        keys = DataFrame(index=[0])
+    n_groups: int = len(keys)
+
+    keep: np.ndarray = band >= 0
+    cell: np.ndarray = group_id[keep] * n_bands + band[keep]
+
+    sums: dict[str, np.ndarray] = {}
+    for col in value_cols:
+        values: np.ndarray = data[col].to_numpy(dtype=np.float64, na_value=0.0)[keep]
+        sums[col] = np.bincount(cell, weights=values, minlength=n_groups * n_bands)
+
+    rebinned: DataFrame = keys.loc[keys.index.repeat(n_bands)].reset_index(drop=True)
+    rebinned["age_band"] = Categorical(np.tile([label for label, _, _ in scheme], n_groups),
+                                       categories=[label for label, _, _ in scheme], ordered=True)
+    for col in value_cols:
+        rebinned[col] = sums[col]
+
+    return rebinned
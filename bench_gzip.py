@@ -0,0 +1,87 @@
+"""Throughput benchmark of the block-gzip writer (row_index.write_csv)
+
+Writes the same long frame with to_csv(compression="gzip") and with write_csv on 1, 2, 4... workers of
+the process and the thread executor, checks that every output decompresses to exactly the same bytes,
+and prints the MB/s of each.
+
+    python bench_gzip.py --rows 2000000
+"""
+from pandas import DataFrame
+from pathlib import Path
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+import gzip
+import os
+import time
+import numpy as np
+from row_index import write_csv
+
+
+def make_long_frame(n_rows: int, seed: int = 0) -> DataFrame:
+    """Synthetic frame shaped like tidy_data/deaths_tidy.csv
+
+    Args:
+        n_rows (int): number of rows
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        data (DataFrame): sex, age, nuts, year_week, deaths, is_provisional, year, week
+    """
+
+    rng: np.random.Generator = np.random.default_rng(seed)
+    weeks: np.ndarray = rng.integers(1, 53, n_rows)
+    years: np.ndarray = rng.integers(2020, 2022, n_rows)
+
+    return DataFrame({
+        "sex": rng.choice(["F", "M"], n_rows),
+        "age": rng.choice(["Y_LT5", "Y10-14", "Y40-44", "Y85-89", "Y_GE90"], n_rows),
+        "nuts": rng.choice([f"ES{number:03d}" for number in range(600)], n_rows),
+        "year_week": [f"{year}W{week:02d}" for year, week in zip(years, weeks)],
+        "deaths": rng.poisson(4, n_rows),
+        "is_provisional": rng.random(n_rows) < 0.1,
+        "year": years,
+        "week": weeks,
+    })
+
+
+def run_benchmark(n_rows: int = 1_000_000, compresslevel: int = 6) -> None:
+    """Prints the write throughput of each writer and checks their outputs match
+
+    Args:
+        n_rows (int, optional): rows of the synthetic frame. Defaults to 1_000_000.
+        compresslevel (int, optional): gzip level of every writer. Defaults to 6.
+    """
+
+    data: DataFrame = make_long_frame(n_rows)
+    worker_counts: list[int] = sorted({1, 2, 4, os.cpu_count() or 1})
+
+    with TemporaryDirectory() as folder:
+        reference_path: Path = Path(folder)/"reference.csv.gz"
+        start: float = time.perf_counter()
+        data.to_csv(reference_path, index=False, compression={"method": "gzip", "compresslevel": compresslevel})
+        elapsed: float = time.perf_counter() - start
+        with gzip.open(reference_path, "rb") as file:
+            reference: bytes = file.read()
+        size_mb: float = len(reference) / 1024**2
+        print(f"# {n_rows} rows, {size_mb:.0f} MB of CSV text")
+        print(f"# to_csv gzip:                  {size_mb / elapsed:7.1f} MB/s")
+
+        for executor in ("process", "thread"):
+            for n_workers in worker_counts:
+                file_path: Path = Path(folder)/f"blocks_{executor}_{n_workers}.csv.gz"
+                start = time.perf_counter()
+                write_csv(data, file_path, compression="gzip", compresslevel=compresslevel, n_workers=n_workers, executor=executor)
+                elapsed = time.perf_counter() - start
+                with gzip.open(file_path, "rb") as file:
+                    identical: bool = file.read() == reference
+                print(f"# write_csv {executor:<7} {n_workers:>2} workers: {size_mb / elapsed:7.1f} MB/s  {'identical' if identical else 'DIFFERENT'}")
+
+
+if __name__ == "__main__" :
+
+    parser = ArgumentParser(description="Block-gzip writer benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--level", type=int, default=6)
+    args = parser.parse_args()
+
+    run_benchmark(args.rows, args.level)
@@ -0,0 +1,153 @@
+"""Startup time benchmark of cli.py
+
+Runs each command in a fresh interpreter several times and reports the best wall time, and checks which
+heavy libraries got imported on the way. `--help` must not import pandas, and the data-only subcommands
+(rates, rank, weekly) must not import matplotlib or scipy.
+
+The commands run in a temporary copy of the project with a small clean_data folder, so the data-only
+subcommands really read and aggregate data without touching the real files. The result cache is emptied
+before every run so each one computes its result.
+
+    python bench_startup.py
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import csv
+import shutil
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES: list[str] = ["pandas", "matplotlib", "openpyxl", "pyarrow", "scipy"]
+
+# (label, cli arguments, modules that must not be imported)
+CASES: list[tuple[str, list[str], list[str]]] = [
+    ("--help", ["--help"], HEAVY_MODULES),
+    ("rates --help", ["rates", "--help"], HEAVY_MODULES),
+    ("rates", ["rates"], ["matplotlib", "scipy"]),
+    ("rank", ["rank"], ["matplotlib", "scipy"]),
+    ("weekly", ["weekly", "--countries", "Xland"], ["matplotlib", "scipy"]),
+    ("import ex5", None, ["matplotlib"]),
+    ("import ex7", None, ["matplotlib"]),
+    ("import ex8", None, ["matplotlib"]),
+]
+
+# Imports the target and prints the heavy modules loaded, instead of running the command
+PROBE: str = """
+import sys, runpy
+sys.argv = {argv!r}
+try:
+    {run}
+except SystemExit:
+    pass
+print(",".join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+
+def make_project(folder: Path, n_regions: int = 50, n_weeks: int = 52) -> None:
+    """Copies the project modules to folder and writes small clean files next to them
+
+    Args:
+        folder (Path): empty folder for the copy
+        n_regions (int, optional): NUTS-3 regions of the synthetic data. Defaults to 50.
+        n_weeks (int, optional): weeks of 2021 in the deaths file. Defaults to 52.
+    """
+
+    for module_path in Path(__file__).parent.glob("*.py"):
+        shutil.copy(module_path, folder/module_path.name)
+    (folder/"clean_data").mkdir()
+    (folder/"results").mkdir()
+
+    regions: list[str] = [f"XX{number:03d}" for number in range(n_regions)]
+    with open(folder/"clean_data"/"deaths_clean.csv", "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["sex", "age", "nuts", "year_week", "deaths", "is_provisional", "year", "week"])
+        for week in list(range(1, n_weeks + 1)) + [99]:
+            for number, region in enumerate(regions):
+                for sex in ("F", "M"):
+                    writer.writerow([sex, "Y85-89", region, f"2021W{week:02d}", (number + week) % 7, False, 2021, week])
+    with open(folder/"clean_data"/"population_clean.csv", "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["sex", "age", "nuts", "year", "population", "is_provisional"])
+        for region in regions:
+            for sex in ("F", "M"):
+                writer.writerow([sex, "Y85-89", region, 2021, 1000.0, False])
+    with open(folder/"clean_data"/"nuts3_clean.csv", "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["nuts3_code", "nuts2_code", "nuts1_code", "country_code", "nuts3_label", "nuts2_label", "nuts1_label", "country_label"])
+        for region in regions:
+            writer.writerow([region, region[:4], region[:3], "XX", f"Region {region}", region[:4], region[:3], "Xland"])
+
+
+def time_case(arguments: list[str], module: str, repeat: int, project: Path) -> tuple[float, list[str]]:
+    """Best wall time of a case over a few runs and the heavy modules it imported
+
+    Args:
+        arguments (list[str]): cli.py arguments, or None to just import a module
+        module (str): module to import when arguments is None
+        repeat (int): number of runs
+        project (Path): project copy to run in, see make_project
+
+    Returns:
+        best, imported (tuple[float, list[str]]): seconds of the fastest run and heavy modules loaded
+
+    Raises:
+        RuntimeError: if the case itself fails (e.g. missing dependencies)
+    """
+
+    if arguments is not None:
+        run: str = "runpy.run_path('cli.py', run_name='__main__')"
+        argv: list[str] = ["cli.py"] + arguments
+    else:
+        run = f"import {module}"
+        argv = [module]
+    code: str = PROBE.format(argv=argv, run=run, heavy=HEAVY_MODULES)
+
+    best: float = float("inf")
+    imported: list[str] = []
+    for _ in range(repeat):
+        shutil.rmtree(project/"results"/".cache", ignore_errors=True)
+        start: float = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", code], cwd=project, capture_output=True, text=True)
+        best = min(best, time.perf_counter() - start)
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+        last_line: str = completed.stdout.strip().splitlines()[-1] if completed.stdout.strip() else ""
+        imported = [name for name in last_line.split(",") if name in HEAVY_MODULES]
+
+    return best, imported
+
+
+def run_benchmark(repeat: int = 5) -> bool:
+    """Prints the startup time of every case and whether it kept away from the forbidden modules
+
+    Args:
+        repeat (int, optional): runs per case. Defaults to 5.
+
+    Returns:
+        passed (bool): True if no case imported a forbidden module
+    """
+
+    passed: bool = True
+
+    with TemporaryDirectory() as folder:
+        project: Path = Path(folder)
+        make_project(project)
+
+        baseline, _ = time_case(None, "sys", repeat, project)
+        print(f"# Bare interpreter: {baseline * 1000:.0f} ms")
+
+        for label, arguments, forbidden in CASES:
+            module: str = label.split()[-1]
+            best, imported = time_case(arguments, module, repeat, project)
+            leaked: list[str] = [name for name in imported if name in forbidden]
+            passed = passed and not leaked
+            status: str = "OK" if not leaked else f"FAIL (imported {', '.join(leaked)})"
+            print(f"# {label:<15} {best * 1000:7.0f} ms  {status}")
+
+    return passed
+
+
+if __name__ == "__main__" :
+
+    sys.exit(0 if run_benchmark() else 1)
@@ -0,0 +1,217 @@
+"""Command line entry point for the whole pipeline
+
+Every subcommand imports its exercise module (and through it pandas, matplotlib...) only when it runs,
+so `python cli.py --help` and the data-only subcommands don't pay for the libraries they don't use.
+
+    python cli.py fetch
+    python cli.py tidy
+    python cli.py clean
+    python cli.py rates
+    python cli.py rank --by nuts3_label
+    python cli.py weekly --countries España France
+    python cli.py report --format svg
+    python cli.py store && python cli.py rank --backend sqlite
+"""
+from argparse import ArgumentParser, Namespace
+import signal
+import sys
+
+
+def run_fetch(args: Namespace) -> None:
+    """Downloads the raw datasets from Eurostat (see create_raw_data)"""
+
+    from create_raw_data import fill_raw_data_folder
+
+    fill_raw_data_folder(args.folder)
+
+
+def run_tidy(args: Namespace) -> None:
+    """Converts the raw datasets to tidy format (see ex2)"""
+
+    from ex2 import tidy_deaths_dataset, tidy_population_dataset, tidy_nuts_catalogue
+
+    tidy_deaths_dataset("deaths_data.csv", "deaths_tidy.csv", debug=args.debug)
+    tidy_population_dataset("population_data.csv", "population_tidy.csv", debug=args.debug)
+    tidy_nuts_catalogue("nuts3_catalogue.csv", "nuts3_tidy.csv")
+
+
+def run_clean(args: Namespace) -> None:
+    """Removes the non informative rows of the tidy datasets (see ex3)"""
+
+    from ex3 import remove_non_informative_rows, copy_file, tidy_and_clean_dataset
+
+    if args.fused:
+        tidy_names: dict[str, str] = {name: f"{name}_tidy.csv" if args.keep_tidy else None for name in ("deaths", "population", "nuts3")}
+        tidy_and_clean_dataset("deaths", "deaths_data.csv", "deaths_clean.csv", tidy_names["deaths"])
+        tidy_and_clean_dataset("population", "population_data.csv", "population_clean.csv", tidy_names["population"])
+        tidy_and_clean_dataset("nuts3", "nuts3_catalogue.csv", "nuts3_clean.csv", tidy_names["nuts3"])
+        return
+
+    remove_non_informative_rows("deaths_tidy.csv", "deaths_clean.csv", "deaths")
+    remove_non_informative_rows("population_tidy.csv", "population_clean.csv", "population")
+    copy_file("tidy_data/nuts3_tidy.csv", "clean_data/nuts3_clean.csv")
+
+
+def run_rates(args: Namespace) -> None:
+    """Exports the mortality rate by region (see ex6)"""
+
+    from ex6 import get_mortality_rate
+
+    get_mortality_rate(args.deaths, args.population, args.catalogue, backend=args.backend)
+
+
+def run_rank(args: Namespace) -> None:
+    """Prints the top 10 regions by deaths (see ex5)"""
+
+    from ex5 import get_top_deaths_by_city
+
+    print(get_top_deaths_by_city(args.deaths, args.catalogue, args.by, backend=args.backend).to_string(index=False))
+
+
+def run_weekly(args: Namespace) -> None:
+    """Prints or exports the weekly mortality rate by country (see ex8)"""
+
+    from ex8 import get_deaths_by_week
+
+    mortality_time_series = get_deaths_by_week(args.deaths, args.catalogue, args.population, backend=args.backend)
+    if args.countries:
+        mortality_time_series = mortality_time_series[mortality_time_series["country_label"].isin(args.countries)]
+
+    if args.output:
+        mortality_time_series.to_csv(args.output, index=False)
+        print(f"# {args.output} exported!")
+    else:
+        print(mortality_time_series.to_string(index=False))
+
+
+def run_report(args: Namespace) -> None:
+    """Writes every chart of the report without opening any window (see report)"""
+
+    from report import render_weekly_report, render_summary_report
+
+    render_weekly_report(args.deaths, args.catalogue, args.population, args.output_dir, args.format, args.workers)
+    render_summary_report(args.deaths, args.catalogue, args.mortality, args.ranges, args.categories, args.output_dir, args.format, args.workers)
+
+
+def run_store(args: Namespace) -> None:
+    """Exports the clean datasets to the SQLite store (see sql_store)"""
+
+    from sql_store import export_to_sqlite
+
+    export_to_sqlite(args.deaths, args.population, args.catalogue)
+
+
+def run_recode(args: Namespace) -> None:
+    """Converts the clean deaths and population to one NUTS version (see nuts_recode)"""
+
+    from nuts_recode import recode_clean_dataset
+
+    for file_name, value_col in [(args.deaths, "deaths"), (args.population, "population")]:
+        output_file_name: str = file_name.replace(".csv", f"_nuts{args.target}.csv")
+        recode_clean_dataset(file_name, output_file_name, value_col, args.catalogue, args.changes, args.population,
+                             args.source, args.target)
+
+
+def run_cache(args: Namespace) -> None:
+    """Prints the result cache size, or empties it (see result_cache)"""
+
+    import result_cache
+
+    if args.clear:
+        function: str = None if args.clear == "all" else args.clear
+        print(f"# Removed {result_cache.invalidate(function)} cache entries")
+        return
+
+    stats: dict = result_cache.get_stats()
+    print(f"# {stats['entries']} entries, {stats['size_mb']:.1f} MB in {result_cache.CACHE_DIR}")
+
+
+def get_parser() -> ArgumentParser:
+    """Builds the argument parser with one subparser per pipeline step
+
+    Returns:
+        parser (ArgumentParser): the command line parser
+    """
+
+    parser = ArgumentParser(prog="cli.py", description="Weekly deaths in the EU NUTS-3 regions: data pipeline and analysis")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fetch = subparsers.add_parser("fetch", help="download the raw datasets from Eurostat")
+    fetch.add_argument("--folder", default="raw_data", help="target folder (default: raw_data)")
+    fetch.set_defaults(handler=run_fetch)
+
+    tidy = subparsers.add_parser("tidy", help="raw_data -> tidy_data")
+    tidy.add_argument("--debug", action="store_true", help="print the bytes copied by every tidy step")
+    tidy.set_defaults(handler=run_tidy)
+
+    clean = subparsers.add_parser("clean", help="tidy_data -> clean_data")
+    clean.add_argument("--fused", action="store_true", help="raw_data -> clean_data in one pass, skipping tidy_data")
+    clean.add_argument("--keep-tidy", action="store_true", help="with --fused, also write tidy_data")
+    clean.set_defaults(handler=run_clean)
+
+    # Subcommands working on the clean data share the input file names
+    clean_files = ArgumentParser(add_help=False)
+    clean_files.add_argument("--deaths", default="deaths_clean.csv", help="deaths file in clean_data")
+    clean_files.add_argument("--population", default="population_clean.csv", help="population file in clean_data")
+    clean_files.add_argument("--catalogue", default="nuts3_clean.csv", help="NUTS-3 catalogue file in clean_data")
+
+    store = subparsers.add_parser("store", parents=[clean_files], help="export clean_data to results/mortality.db")
+    store.set_defaults(handler=run_store)
+
+    recode = subparsers.add_parser("recode", parents=[clean_files], help="convert clean_data to one NUTS version")
+    recode.add_argument("--changes", default="nuts_changes.csv", help="NUTS change table in raw_data")
+    recode.add_argument("--source", default="2016", help="NUTS version to convert from (default: 2016)")
+    recode.add_argument("--target", default="2021", help="NUTS version to convert to (default: 2021)")
+    recode.set_defaults(handler=run_recode)
+
+    # Subcommands that can run their query in the SQLite store instead of pandas
+    query_backend = ArgumentParser(add_help=False)
+    query_backend.add_argument("--backend", choices=["pandas", "sqlite"], default="pandas", help="query engine (default: pandas)")
+
+    rates = subparsers.add_parser("rates", parents=[clean_files, query_backend], help="export results/mortality_rate_by_region.csv")
+    rates.set_defaults(handler=run_rates)
+
+    rank = subparsers.add_parser("rank", parents=[clean_files, query_backend], help="top 10 regions by deaths in 2021")
+    rank.add_argument("--by", default="nuts3_label", help="column to rank by (default: nuts3_label)")
+    rank.set_defaults(handler=run_rank)
+
+    weekly = subparsers.add_parser("weekly", parents=[clean_files, query_backend], help="weekly mortality rate by country")
+    weekly.add_argument("--countries", nargs="*", help="country labels to keep (default: all)")
+    weekly.add_argument("--output", help="CSV file to export instead of printing")
+    weekly.set_defaults(handler=run_weekly)
+
+    report = subparsers.add_parser("report", parents=[clean_files], help="write every chart to disk")
+    report.add_argument("--mortality", default="mortality_rate_by_region.csv", help="mortality rates file in results")
+    report.add_argument("--ranges", nargs="+", type=float, default=[0, 9, 12, 100], help="mortality category cut points")
+    report.add_argument("--categories", nargs="+", default=["Below average", "Average", "Over average"], help="mortality category names")
+    report.add_argument("--output-dir", default="results/charts", help="folder for the charts (default: results/charts)")
+    report.add_argument("--format", choices=["png", "svg"], default="png", help="chart file format")
+    report.add_argument("--workers", type=int, default=None, help="processes to render with (default: all cores)")
+    report.set_defaults(handler=run_report)
+
+    cache = subparsers.add_parser("cache", help="show or clear the cached analysis results")
+    cache.add_argument("--clear", nargs="?", const="all", help="remove every entry, or those of one function, e.g. ex6.get_mortality_rate")
+    cache.set_defaults(handler=run_cache)
+
+    return parser
+
+
+def main(argv: list[str] = None) -> None:
+    """Parses the command line and runs the selected subcommand
+
+    Args:
+        argv (list[str], optional): arguments without the program name. Defaults to sys.argv[1:].
+    """
+
+    # Die quietly when the output is piped into a program that stops reading (e.g. `| head`),
+    # instead of raising BrokenPipeError while printing
+    if hasattr(signal, "SIGPIPE"):
+        signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+
+    args: Namespace = get_parser().parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__" :
+
+    main(sys.argv[1:])
@@ -0,0 +1,170 @@
+from pandas import DataFrame, Series
+from concurrent.futures import ProcessPoolExecutor
+from scipy.special import gammaincinv
+import numpy as np
+
+
+def get_garwood_interval(deaths: np.ndarray, population: np.ndarray, alpha: float = 0.05, per: float = 1000) -> tuple[np.ndarray, np.ndarray]:
+    """Exact Poisson (Garwood) confidence interval for crude rates, for all the rows at once
+
+    Args:
+        deaths (np.ndarray): observed counts
+        population (np.ndarray): population at risk, same shape as deaths
+        alpha (float, optional): 1 - confidence level. Defaults to 0.05.
+        per (float, optional): rate multiplier. Defaults to 1000.
+
+    Returns:
+        lower, upper (tuple[np.ndarray, np.ndarray]): interval bounds of the rate
+    """
+
+    deaths = np.asarray(deaths, dtype=np.float64)
+    population = np.asarray(population, dtype=np.float64)
+
+    # chi2(2d, q) / 2 is the gamma(d, q) quantile: gammaincinv avoids going through scipy.stats
+    lower: np.ndarray = np.where(deaths > 0, gammaincinv(np.maximum(deaths, 1), alpha / 2), 0.0)
+    upper: np.ndarray = gammaincinv(deaths + 1, 1 - alpha / 2)
+
+    return lower / population * per, upper / population * per
+
+
+def get_crude_rate_intervals(data: DataFrame, deaths_col: str = "deaths", population_col: str = "population", alpha: float = 0.05, per: float = 1000) -> DataFrame:
+    """Adds the crude mortality rate and its exact Poisson interval to every row
+
+    Args:
+        data (DataFrame): one row per region (and week, year...) with deaths and population
+        deaths_col (str, optional): deaths column. Defaults to "deaths".
+        population_col (str, optional): population column. Defaults to "population".
+        alpha (float, optional): 1 - confidence level. Defaults to 0.05.
+        per (float, optional): rate multiplier. Defaults to 1000.
+
+    Returns:
+        rates (DataFrame): copy of data with mortality_rate, rate_lower and rate_upper columns
+    """
+
+    deaths: np.ndarray = data[deaths_col].to_numpy(dtype=np.float64)
+    population: np.ndarray = data[population_col].to_numpy(dtype=np.float64)
+
+    lower, upper = get_garwood_interval(deaths, population, alpha, per)
+
+    rates: DataFrame = data.assign(mortality_rate=deaths / population * per, rate_lower=lower, rate_upper=upper)
+
+    return rates
+
+
+def _get_age_matrices(deaths: DataFrame, population: DataFrame, by: list[str]) -> tuple[DataFrame, DataFrame]:
+    """Aggregates deaths and population to (groups x age) matrices aligned on the same axes"""
+
+    deaths_by_age: DataFrame = deaths.groupby(by + ["age"])["deaths"].sum().unstack("age", fill_value=0)
+
+    population_keys: list[str] = [col for col in by if col in population.columns]
+    population_by_age: DataFrame = population.groupby(population_keys + ["age"])["population"].sum().unstack("age")
+
+    # Weekly deaths share the yearly population: broadcast it through the group keys
+    population_by_age = deaths_by_age[[]].reset_index().merge(population_by_age.reset_index(), how="left", on=population_keys).set_index(by)
+    population_by_age = population_by_age.reindex(columns=deaths_by_age.columns)
+
+    return deaths_by_age, population_by_age
+
+
+def get_standardized_rate_intervals(deaths: DataFrame, population: DataFrame, by: tuple[str, ...] = ("nuts", "year"), standard_population: Series = None, alpha: float = 0.05, per: float = 1000) -> DataFrame:
+    """Directly age-standardized rates with the gamma (Fay-Feuer) interval, for every group at once
+
+    Args:
+        deaths (DataFrame): clean deaths data (sex, age, nuts, year, week, deaths...)
+        population (DataFrame): clean population data (sex, age, nuts, year, population...)
+        by (tuple[str, ...], optional): grouping columns. Defaults to ("nuts", "year").
+        standard_population (Series, optional): population by age used as standard. Defaults to the
+            pooled population of the input data.
+        alpha (float, optional): 1 - confidence level. Defaults to 0.05.
+        per (float, optional): rate multiplier. Defaults to 1000.
+
+    Returns:
+        rates (DataFrame): one row per group with deaths, population, standardized_rate, rate_lower and rate_upper
+    """
+
+    by = list(by)
+    deaths_by_age, population_by_age = _get_age_matrices(deaths, population, by)
+
+    if standard_population is None:
+        standard_population = population.groupby("age")["population"].sum()
+
+    weights: np.ndarray = standard_population.reindex(deaths_by_age.columns).fillna(0).to_numpy(dtype=np.float64)
+    weights = weights / weights.sum()
+
+    d: np.ndarray = deaths_by_age.to_numpy(dtype=np.float64)
+    n: np.ndarray = population_by_age.to_numpy(dtype=np.float64)
+    # Age bands without population don't contribute to the rate
+    valid: np.ndarray = np.isfinite(n) & (n > 0)
+    w_over_n: np.ndarray = np.where(valid, weights / np.where(valid, n, 1), 0.0)
+
+    rate: np.ndarray = (w_over_n * d).sum(axis=1)
+    variance: np.ndarray = (w_over_n ** 2 * d).sum(axis=1)
+    w_max: np.ndarray = w_over_n.max(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lower: np.ndarray = np.where(rate > 0, gammaincinv(rate ** 2 / variance, alpha / 2) * variance / rate, 0.0)
+        upper: np.ndarray = gammaincinv((rate + w_max) ** 2 / (variance + w_max ** 2), 1 - alpha / 2) * (variance + w_max ** 2) / (rate + w_max)
+
+    rates: DataFrame = DataFrame({
+        "deaths": d.sum(axis=1),
+        "population": np.where(valid, n, 0).sum(axis=1),
+        "standardized_rate": rate * per,
+        "rate_lower": lower * per,
+        "rate_upper": upper * per,
+    }, index=deaths_by_age.index).reset_index()
+
+    return rates
+
+
+def _bootstrap_quantiles(expected: np.ndarray, scale: np.ndarray, n_replicates: int, quantiles: np.ndarray, seed: np.random.SeedSequence, batch_size: int) -> np.ndarray:
+    """Draws Poisson replicates of (groups x ages) expected counts and returns the rate quantiles per group"""
+
+    rng: np.random.Generator = np.random.default_rng(seed)
+    replicates: list[np.ndarray] = []
+
+    for start in range(0, n_replicates, batch_size):
+        size: int = min(batch_size, n_replicates - start)
+        draws: np.ndarray = rng.poisson(expected, size=(size,) + expected.shape)
+        replicates.append((draws * scale).sum(axis=-1))
+
+    return np.quantile(np.concatenate(replicates), quantiles, axis=0)
+
+
+def get_bootstrap_intervals(deaths: np.ndarray, scale: np.ndarray, n_replicates: int = 1000, alpha: float = 0.05, n_workers: int = 1, random_state: int = None, batch_size: int = 100) -> tuple[np.ndarray, np.ndarray]:
+    """Parametric (Poisson) bootstrap interval of a rate that is a weighted sum of counts
+
+    Every group (row) is resampled at the same time. With a crude rate pass deaths as a column vector and
+    scale = per / population; with a standardized rate pass the (groups x ages) matrices and
+    scale = per * weight / population.
+
+    Args:
+        deaths (np.ndarray): observed counts, (groups,) or (groups, ages)
+        scale (np.ndarray): multiplier of each count in the rate, same shape as deaths
+        n_replicates (int, optional): number of bootstrap replicates. Defaults to 1000.
+        alpha (float, optional): 1 - confidence level. Defaults to 0.05.
+        n_workers (int, optional): processes to split the groups between. Defaults to 1.
+        random_state (int, optional): seed for reproducible intervals. Defaults to None.
+        batch_size (int, optional): replicates drawn per numpy call, bounds memory. Defaults to 100.
+
+    Returns:
+        lower, upper (tuple[np.ndarray, np.ndarray]): percentile interval bounds of the rate
+    """
+
+    expected: np.ndarray = np.atleast_2d(np.asarray(deaths, dtype=np.float64).T).T
+    scale = np.atleast_2d(np.asarray(scale, dtype=np.float64).T).T
+    quantiles: np.ndarray = np.array([alpha / 2, 1 - alpha / 2])
+
+    if n_workers <= 1:
+        bounds: np.ndarray = _bootstrap_quantiles(expected, scale, n_replicates, quantiles, np.random.SeedSequence(random_state), batch_size)
+        return bounds[0], bounds[1]
+
+    # Groups are resampled independently, so each worker takes a slice of the rows with its own stream
+    seeds: list[np.random.SeedSequence] = np.random.SeedSequence(random_state).spawn(n_workers)
+    slices: list[np.ndarray] = np.array_split(np.arange(expected.shape[0]), n_workers)
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [executor.submit(_bootstrap_quantiles, expected[rows], scale[rows], n_replicates, quantiles, seed, batch_size)
+                   for rows, seed in zip(slices, seeds) if len(rows) > 0]
+        bounds = np.concatenate([future.result() for future in futures], axis=1)
+
+    return bounds[0], bounds[1]
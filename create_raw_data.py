@@ -1,6 +1,7 @@
 # Libraries
 from pandas import DataFrame, read_csv, read_excel, Index
 from pathlib import Path
+from row_index import write_csv
 
 #raw_data folder
 def prepare_raw_data_folder() -> None:
@@ -81,6 +82,24 @@ def get_nuts3_catalogue(url: str = "https://ec.europa.eu/eurostat/documents/3451
     
     return data
 
+def get_nuts_changes(url: str = "https://ec.europa.eu/eurostat/documents/345175/629341/NUTS2021.xlsx", sheet_name: str = "NUTS2016-NUTS2021") -> DataFrame:
+    """Fetch the table of NUTS changes between two versions from Eurostat (see nuts_recode)
+
+    Args:
+        url (str, optional): NUTS 2021 workbook. Defaults to "https://ec.europa.eu/eurostat/documents/345175/629341/NUTS2021.xlsx".
+        sheet_name (str, optional): sheet with the changes. Defaults to "NUTS2016-NUTS2021".
+
+    Returns:
+        data (DataFrame): one row per changed region, with its 'Code 2016' and 'Code 2021'
+    """
+
+    data = read_excel(url, sheet_name=sheet_name, index_col=None)
+    
+    # For our mental health: we trim all the column names
+    data = data.rename(columns=lambda x: x.strip())
+    
+    return data
+
 def get_matching_columns(source_columns: list[str], model_columns: list[str]) -> list[str]:
     """Match the year-level columns between two DataFrames
 
@@ -182,14 +201,26 @@ def fill_raw_data_folder(target_folder: str="raw_data") -> None:
     nuts3_catalogue = get_nuts3_catalogue()
     print("# NUTS3 catalogue fetched")
     
-    deaths_data_subset.to_csv(target_folder/"deaths_data.csv", index=False, compression="gzip")
+    write_csv(deaths_data_subset, target_folder/"deaths_data.csv", compression="gzip")
     print("# Deaths dataset exported!")
     
-    population_data_subset.to_csv(target_folder/"population_data.csv", index=False, compression="gzip")
+    write_csv(population_data_subset, target_folder/"population_data.csv", compression="gzip")
     print("# Population dataset exported")
     
-    nuts3_catalogue.to_csv(target_folder/"nuts3_catalogue.csv", index=False, compression="gzip")
+    write_csv(nuts3_catalogue, target_folder/"nuts3_catalogue.csv", compression="gzip")
     print("# NUTS3 catalogue exported")
+    
+    # The change table is only needed by nuts_recode: a failure must not lose the core datasets
+    print("# Fetching NUTS changes...")
+    try:
+        nuts_changes = get_nuts_changes()
+    except (OSError, ValueError) as error:
+        print(f"# NUTS changes could not be fetched, skipping them: {error}")
+        return
+    print("# NUTS changes fetched")
+    
+    write_csv(nuts_changes, target_folder/"nuts_changes.csv", compression="gzip")
+    print("# NUTS changes exported")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 from pandas import DataFrame, read_csv
 from pathlib import Path
-import gzip
+from row_index import get_row_index, read_head
 
 def get_row_count(file: str) -> int:
     """Count rows of a file in a stream way
@@ -15,7 +15,8 @@ def get_row_count(file: str) -> int:
     base: Path = Path(__file__).parent 
     target_file: Path = base/"raw_data"/file
     
-    rows: int = sum(1 for line in gzip.open(target_file)) -1
+    # Counted once while building the sidecar index, then read from it
+    rows: int = get_row_index(target_file)["n_rows"]
     
     return rows
 
@@ -53,6 +54,6 @@ def print_top_rows(file: str) -> None:
     base: Path = Path(__file__).parent 
     target_file: Path = base/"raw_data"/file
     
-    data: DataFrame = read_csv(target_file, compression="gzip")
+    data: DataFrame = read_head(target_file, 5)
     
-    print(data.head())
+    print(data)
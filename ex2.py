@@ -1,8 +1,26 @@
 from pathlib import Path
-from pandas import DataFrame, read_csv, melt, options
-from numpy import NaN
-options.mode.chained_assignment = None
+from typing import Callable
+from pandas import DataFrame, Series, read_csv, melt, option_context
+import numpy as np
+from row_index import write_csv
 
+def transform_step(allocates: bool) -> Callable:
+    """Declares whether a tidy step allocates a new full-size frame or only new columns
+
+    Args:
+        allocates (bool): True if the step copies every column (reshapes, row filters)
+
+    Returns:
+        decorator (Callable): sets the 'allocates' attribute of the step
+    """
+
+    def decorator(step: Callable) -> Callable:
+        step.allocates = allocates
+        return step
+
+    return decorator
+
+@transform_step(allocates=False)
 def remove_nr_value(data: DataFrame, col_name: str) -> DataFrame:
     """Function to remove 'NR' string from a variable
 
@@ -13,33 +31,33 @@ def remove_nr_value(data: DataFrame, col_name: str) -> DataFrame:
     Returns:
         DataFrame: same dataframe without NR string
     """
-    
-    cleaned_data: DataFrame = data
-    
-    cleaned_data [col_name] = cleaned_data[col_name].str.replace("NR,", "")
-    
+
+    cleaned_data: DataFrame = data.assign(**{col_name: data[col_name].str.replace("NR,", "")})
+
     return cleaned_data
 
+@transform_step(allocates=False)
 def explode_variable(data: DataFrame, column_to_explode: str, returned_col_names: list[str]):
-    """Function to convert to 
+    """Function to convert a comma separated column to one column per value
 
     Args:
-        data (DataFrame): _description_
-        column_to_explode (str): _description_
-        returned_col_names (list[str]): _description_
+        data (DataFrame): input data
+        column_to_explode (str): column with the comma separated values
+        returned_col_names (list[str]): names of the new columns
 
     Returns:
-        _type_: _description_
+        exploded_data (DataFrame): the input data with the new columns instead of column_to_explode
     """
-    
+
     cleaned_data: DataFrame = remove_nr_value(data, column_to_explode)
-    
-    exploded_data: DataFrame = cleaned_data
-    exploded_data[returned_col_names] = exploded_data[column_to_explode].str.split(",", expand=True)
-    exploded_data = exploded_data.drop([column_to_explode], axis=1)
-    
+
+    parts: DataFrame = cleaned_data[column_to_explode].str.split(",", expand=True)
+    exploded_data: DataFrame = cleaned_data.drop(columns=[column_to_explode]).assign(
+        **{name: parts[position] for position, name in enumerate(returned_col_names)})
+
     return exploded_data
 
+@transform_step(allocates=True)
 def pivot_longer(data: DataFrame, id_cols: list[str], new_variable_name: str, new_value_name: str) -> DataFrame:
     """Melt the columns (years, years-week) to variables
 
@@ -52,11 +70,12 @@ def pivot_longer(data: DataFrame, id_cols: list[str], new_variable_name: str, ne
     Returns:
         pivoted_data (DataFrame): the pivoted DataFrame
     """
-    
+
     pivoted_data: DataFrame = melt(data, id_vars=id_cols, var_name=new_variable_name, value_name=new_value_name)
-    
+
     return pivoted_data
 
+@transform_step(allocates=False)
 def get_p_variable(data: DataFrame, col_with_p:str) -> DataFrame:
     """Converts p string in value column to a new boolean column and remove the string
 
@@ -67,15 +86,15 @@ def get_p_variable(data: DataFrame, col_with_p:str) -> DataFrame:
     Returns:
         data_p (DataFrame): DataFrame with values without p
     """
-    
-    data_p: DataFrame = data 
-    data_p["is_provisional"] = data_p[col_with_p].str.contains("p")
-    data_p[col_with_p] = data_p[col_with_p].str.replace(" p", "")
-    data_p[col_with_p] = data_p[col_with_p].str.replace(" ep", "")
-    data_p[col_with_p] = data_p[col_with_p].str.replace(" e", "")
-    
+
+    values: Series = data[col_with_p]
+    # One pass for the ' p', ' ep' and ' e' flags instead of one replace each
+    data_p: DataFrame = data.assign(**{col_with_p: values.str.replace(r" (?:ep|p|e)", "", regex=True),
+                                       "is_provisional": values.str.contains("p")})
+
     return data_p
 
+@transform_step(allocates=False)
 def fix_indicator(data: DataFrame, indicator_name: str) -> DataFrame:
     """Fix and parse the indicator column to numerical value
 
@@ -86,13 +105,13 @@ def fix_indicator(data: DataFrame, indicator_name: str) -> DataFrame:
     Returns:
         cleaned_data (DataFrame): cleaned DataFrame
     """
-    
-    cleaned_data: DataFrame = data
-    cleaned_data.loc[cleaned_data[indicator_name].str.contains(":"), indicator_name] = NaN
-    cleaned_data[indicator_name] = cleaned_data[indicator_name].astype('Int32')
-    
+
+    values: Series = data[indicator_name]
+    cleaned_data: DataFrame = data.assign(**{indicator_name: values.mask(values.str.contains(":")).astype('Int32')})
+
     return cleaned_data
 
+@transform_step(allocates=True)
 def filter_nuts3_level(data: DataFrame, nuts_col_name: str) -> DataFrame:
     """Filters and return the NUTS-3 catalogue in tidy format with the relational values
 
@@ -103,11 +122,12 @@ def filter_nuts3_level(data: DataFrame, nuts_col_name: str) -> DataFrame:
     Returns:
         filtered_data (DataFrame): the filtered DataFrame
     """
-    
-    filtered_data: DataFrame = data.query(f"{nuts_col_name}.str.len() == 5")
-    
+
+    filtered_data: DataFrame = data[data[nuts_col_name].str.len() == 5]
+
     return filtered_data
 
+@transform_step(allocates=False)
 def expand_year_week(data: DataFrame, year_week_col: str) -> DataFrame:
     """Explodes year-week string variable to year and week column separatly
 
@@ -116,16 +136,14 @@ def expand_year_week(data: DataFrame, year_week_col: str) -> DataFrame:
         year_week_col (str): column to explode
 
     Returns:
-        expanded_data (DataFrame): _description_
+        expanded_data (DataFrame): the input data with the new year and week columns
     """
-    
-    expanded_data: DataFrame = data
-    
-    expanded_data["year"] = expanded_data[year_week_col].str[0:4]
-    expanded_data["week"] = expanded_data[year_week_col].str[5:]
-    
+
+    expanded_data: DataFrame = data.assign(year=data[year_week_col].str[0:4], week=data[year_week_col].str[5:])
+
     return expanded_data
 
+@transform_step(allocates=True)
 def remove_totals(data: DataFrame) -> DataFrame:
     """Removes aggregated rows (Totals)
 
@@ -135,13 +153,12 @@ def remove_totals(data: DataFrame) -> DataFrame:
     Returns:
         filtered_data (DataFrame): the filtered DataFrame
     """
-    
-    filtered_data: DataFrame = data
-    filtered_data = filtered_data.query("sex != 'T'")
-    filtered_data = filtered_data.query("age != 'TOTAL'")
-    
+
+    filtered_data: DataFrame = data[(data["sex"] != "T") & (data["age"] != "TOTAL")]
+
     return filtered_data
 
+@transform_step(allocates=False)
 def collapse_columns(data: DataFrame, columns_to_collapse: list[str], collapsed_col_name: str) -> DataFrame:
     """Collapse columns for tidy format
 
@@ -153,117 +170,198 @@ def collapse_columns(data: DataFrame, columns_to_collapse: list[str], collapsed_
     Returns:
         collapsed_data (DataFrame): the collapsed DataFrame
     """
-    
-    collapsed_data: DataFrame = data 
-    
-    collapsed_data[collapsed_col_name] = collapsed_data[columns_to_collapse].agg(lambda x: "".join(x.values), axis=1)
-    
+
+    first_column: Series = data[columns_to_collapse[0]]
+    collapsed: Series = first_column.str.cat([data[col] for col in columns_to_collapse[1:]], na_rep="")
+    collapsed_data: DataFrame = data.assign(**{collapsed_col_name: collapsed})
+
     return collapsed_data
 
-def tidy_deaths_dataset(input_file_name: str, output_file_name: str) -> None:
+def _get_column_buffer(column: Series) -> np.ndarray:
+    """Numpy buffer holding the values of a column, used to know if two frames share it"""
+
+    array = column.array
+    # Masked arrays (Int32, boolean) keep their values in _data
+    buffer = getattr(array, "_data", None)
+
+    return buffer if isinstance(buffer, np.ndarray) else np.asarray(array)
+
+def get_copied_bytes(before: DataFrame, after: DataFrame) -> int:
+    """Bytes of the new buffers of 'after', the columns not shared with 'before'
+
+    Only the column buffers are counted: for string (object) columns that is the array of pointers,
+    not the string objects, which are usually shared with the input.
+
+    Args:
+        before (DataFrame): input of a step
+        after (DataFrame): output of the step
+
+    Returns:
+        copied_bytes (int): memory allocated by the step for its output
+    """
+
+    before_buffers: list[np.ndarray] = [_get_column_buffer(before[col]) for col in before.columns]
+    copied_bytes: int = 0
+
+    for col in after.columns:
+        buffer: np.ndarray = _get_column_buffer(after[col])
+        if not any(np.may_share_memory(buffer, other) for other in before_buffers):
+            copied_bytes += int(buffer.nbytes)
+
+    return copied_bytes
+
+def run_transform_chain(data: DataFrame, steps: list[tuple[Callable, dict]], debug: bool = False) -> DataFrame:
+    """Applies the tidy steps one after the other, keeping a single reference to the current frame
+
+    Every helper returns a new frame instead of writing into its input. The chain runs with
+    copy-on-write, so the unchanged columns are shared between both frames and only the new columns
+    are allocated. The option is only set for the chain, not for the rest of the program.
+
+    Args:
+        data (DataFrame): input DataFrame
+        steps (list[tuple[Callable, dict]]): transform_step functions and their keyword arguments
+        debug (bool, optional): print the bytes copied by every step. Defaults to False.
+
+    Returns:
+        data (DataFrame): the transformed DataFrame
+    """
+
+    total_bytes: int = 0
+
+    with option_context("mode.copy_on_write", True):
+        for step, kwargs in steps:
+            print(f"# {step.__name__}...")
+            result: DataFrame = step(data, **kwargs)
+
+            if debug:
+                copied_bytes: int = get_copied_bytes(data, result)
+                total_bytes += copied_bytes
+                kind: str = "new frame" if step.allocates else "new columns"
+                print(f"## [debug] {kind}: {copied_bytes / 1024**2:.1f} MB of new buffers, {len(result)} rows")
+
+            # Rebinding drops the previous frame before the next step runs
+            data = result
+
+    if debug:
+        print(f"## [debug] total: {total_bytes / 1024**2:.1f} MB of new buffers")
+
+    return data
+
+def get_tidy_deaths(input_file_name: str, debug: bool = False) -> DataFrame:
+    """Reads the raw deaths dataset and returns it in tidy format
+
+    Rows are filtered (NUTS-3 level, no totals) while the data is still wide, so the melt only
+    produces the rows that are kept and the long frame is built once.
+
+    Args:
+        input_file_name (str): input file name in raw_data
+        debug (bool, optional): print the bytes copied by every step. Defaults to False.
+
+    Returns:
+        tidy_data (DataFrame): the tidy deaths DataFrame
+    """
+
+    file_path: Path = Path(__file__).parent/"raw_data"/input_file_name
+
+    print(f"# Reading dataset: '{input_file_name}'...")
+    data: DataFrame = read_csv(file_path, index_col=None, engine="pyarrow", compression="gzip")
+
+    tidy_data: DataFrame = run_transform_chain(data, [
+        (explode_variable, {"column_to_explode": "unit,sex,age,geo\\time", "returned_col_names": ["sex", "age", "nuts"]}),
+        (filter_nuts3_level, {"nuts_col_name": "nuts"}),
+        (remove_totals, {}),
+        (pivot_longer, {"id_cols": ["sex", "age", "nuts"], "new_variable_name": "year_week", "new_value_name": "deaths"}),
+        (get_p_variable, {"col_with_p": "deaths"}),
+        (fix_indicator, {"indicator_name": "deaths"}),
+        (expand_year_week, {"year_week_col": "year_week"}),
+    ], debug)
+
+    return tidy_data
+
+def tidy_deaths_dataset(input_file_name: str, output_file_name: str, debug: bool = False) -> None:
     """Exports the tidy deaths DataFrame
 
     Args:
         input_file_name (str): input file name
         output_file_name (str): location to outpu the tidy data
+        debug (bool, optional): print the bytes copied by every step. Defaults to False.
     """
-    
+
     print("-"*20)
 
-    base_path: Path = Path(__file__).parent 
-    file_path: Path = base_path/"raw_data"/input_file_name
-    result_file_path: Path = base_path/"tidy_data"/output_file_name
-    
-    print(f"# Reading dataset: '{input_file_name}'...")
-    data: DataFrame = read_csv(file_path, index_col=None, engine="pyarrow", compression="gzip")
-    
-    print("# Exploding variables...")
-    exploded_data: DataFrame = explode_variable(data, "unit,sex,age,geo\\time", ["sex", "age", "nuts"])
-    
-    print("# Reshaping to long format...")
-    long_format_data: DataFrame = pivot_longer(exploded_data, ["sex", "age", "nuts"], "year_week", "deaths")
-    
-    print("# Creting 'is_provisional' column (bool)...")
-    p_data: DataFrame = get_p_variable(long_format_data, "deaths")
-    
-    print("# Fixing indicator column...")
-    cleaned_data: DataFrame = fix_indicator(p_data, "deaths")
-    
-    print("# Filtering by NUTS3 level rows...")
-    filtered_data: DataFrame = filter_nuts3_level(cleaned_data, "nuts")
-    
-    print("# Creating year and week variables...")
-    expanded_data: DataFrame = expand_year_week(filtered_data, "year_week")
-    
-    print("# Removing totals...")
-    tidy_data: DataFrame = remove_totals(expanded_data)
-    
+    result_file_path: Path = Path(__file__).parent/"tidy_data"/output_file_name
+    tidy_data: DataFrame = get_tidy_deaths(input_file_name, debug)
+
     print(f"# Exporting: {output_file_name}")
-    tidy_data.to_csv(result_file_path, compression="gzip", index=False)
+    write_csv(tidy_data, result_file_path, compression="gzip")
     print(f"# {output_file_name} exported!")
-    
+
     print(f"# Columns of the dataset {output_file_name}")
     print(tidy_data.head())
-    
+
     return
 
-def tidy_population_dataset(input_file_name: str, output_file_name: str) -> None:
+def get_tidy_population(input_file_name: str, debug: bool = False) -> DataFrame:
+    """Reads the raw population dataset and returns it in tidy format
+
+    Args:
+        input_file_name (str): input file name in raw_data
+        debug (bool, optional): print the bytes copied by every step. Defaults to False.
+
+    Returns:
+        tidy_data (DataFrame): the tidy population DataFrame
+    """
+
+    file_path: Path = Path(__file__).parent/"raw_data"/input_file_name
+
+    print(f"# Reading dataset: '{input_file_name}'...")
+    data: DataFrame = read_csv(file_path, index_col=None, engine="pyarrow", compression="gzip")
+
+    tidy_data: DataFrame = run_transform_chain(data, [
+        (explode_variable, {"column_to_explode": "sex,unit,age,geo\\time", "returned_col_names": ["sex", "age", "nuts"]}),
+        (filter_nuts3_level, {"nuts_col_name": "nuts"}),
+        (remove_totals, {}),
+        (pivot_longer, {"id_cols": ["sex", "age", "nuts"], "new_variable_name": "year", "new_value_name": "population"}),
+        (get_p_variable, {"col_with_p": "population"}),
+        (fix_indicator, {"indicator_name": "population"}),
+    ], debug)
+
+    return tidy_data
+
+def tidy_population_dataset(input_file_name: str, output_file_name: str, debug: bool = False) -> None:
     """Exports the tidy population DataFrame
 
     Args:
         input_file_name (str): input file name
         output_file_name (str): location to outpu the tidy data
+        debug (bool, optional): print the bytes copied by every step. Defaults to False.
     """
-    
+
     print("-"*20)
 
-    base_path: Path = Path(__file__).parent 
-    file_path: Path = base_path/"raw_data"/input_file_name
-    result_file_path: Path = base_path/"tidy_data"/output_file_name
-    
-    print(f"# Reading dataset: '{input_file_name}'...")
-    data: DataFrame = read_csv(file_path, index_col=None, engine="pyarrow", compression="gzip")
-    
-    print("# Exploding variables...")
-    exploded_data: DataFrame = explode_variable(data, "sex,unit,age,geo\\time", ["sex", "age", "nuts"])
-    
-    print("# Reshaping to long format...")
-    long_format_data: DataFrame = pivot_longer(exploded_data, ["sex", "age", "nuts"], "year", "population")
-    
-    print("# Creting 'is_provisional' column (bool)...")
-    p_data: DataFrame = get_p_variable(long_format_data, "population")
-    
-    print("# Fixing indicator column...")
-    cleaned_data: DataFrame = fix_indicator(p_data, "population")
-    
-    print("# Filtering by NUTS3 level rows...")
-    filtered_data: DataFrame = filter_nuts3_level(cleaned_data, "nuts")
-    
-    print("# Removing totals...")
-    tidy_data: DataFrame = remove_totals(filtered_data)
-    
+    result_file_path: Path = Path(__file__).parent/"tidy_data"/output_file_name
+    tidy_data: DataFrame = get_tidy_population(input_file_name, debug)
+
     print(f"# Exporting: {output_file_name}")
-    tidy_data.to_csv(result_file_path, compression="gzip", index=False)
+    write_csv(tidy_data, result_file_path, compression="gzip")
     print(f"# {output_file_name} exported!")
-    
+
     print(f"# Columns of the dataset {output_file_name}")
     print(tidy_data.head())
-    
+
     return
     
-def tidy_nuts_catalogue(input_file_name: str, output_file_name: str) -> None:
-    """Exports the tidy NUTS DataFrame
+def get_tidy_nuts_catalogue(input_file_name: str) -> DataFrame:
+    """Reads the raw NUTS catalogue and returns the NUTS-3 regions with their upper levels
 
     Args:
-        input_file_name (str): input file name
-        output_file_name (str): location to outpu the tidy data
+        input_file_name (str): input file name in raw_data
+
+    Returns:
+        rearranged_data (DataFrame): the tidy NUTS DataFrame
     """
     
-    print("-"*20)
-    
-    base_path: Path = Path(__file__).parent 
-    file_path: Path = base_path/"raw_data"/input_file_name
-    result_file_path: Path = base_path/"tidy_data"/output_file_name
+    file_path: Path = Path(__file__).parent/"raw_data"/input_file_name
     
     print(f"# Reading dataset: '{input_file_name}'...")
     data: DataFrame = read_csv(file_path, index_col=None, engine="pyarrow", compression="gzip")
@@ -303,8 +401,23 @@ def tidy_nuts_catalogue(input_file_name: str, output_file_name: str) -> None:
     print("# Rearranging columns...")
     rearranged_data: DataFrame = nuts3_data[["nuts3_code", "nuts2_code", "nuts1_code", "country_code", "nuts3_label", "nuts2_label", "nuts1_label", "country_label"]]
     
+    return rearranged_data
+
+def tidy_nuts_catalogue(input_file_name: str, output_file_name: str) -> None:
+    """Exports the tidy NUTS DataFrame
+
+    Args:
+        input_file_name (str): input file name
+        output_file_name (str): location to outpu the tidy data
+    """
+    
+    print("-"*20)
+    
+    result_file_path: Path = Path(__file__).parent/"tidy_data"/output_file_name
+    rearranged_data: DataFrame = get_tidy_nuts_catalogue(input_file_name)
+    
     print(f"# Exporting {output_file_name}...")
-    rearranged_data.to_csv(result_file_path, index=False)
+    write_csv(rearranged_data, result_file_path)
     print(f"# {output_file_name} exprted!")
     
     print(f"# Columns of the dataset {output_file_name}")
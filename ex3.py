@@ -1,6 +1,27 @@
 from pathlib import Path 
 from pandas import DataFrame, read_csv
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from row_index import write_csv
+
+def remove_non_informative(data: DataFrame, indicator_column: str) -> DataFrame:
+    """Drops the rows whose indicator is NaN or 0
+
+    Args:
+        data (DataFrame): tidy DataFrame
+        indicator_column (str): indicator column
+
+    Returns:
+        non_0_data (DataFrame): the informative rows
+    """
+    
+    print(f"# Removing NaN rows based on '{indicator_column}' variable...")
+    non_nan_data: DataFrame = data.dropna(subset=[indicator_column])
+    
+    print(f"# Removing 0 value rows based on '{indicator_column}' variable...")
+    non_0_data: DataFrame = non_nan_data[non_nan_data[indicator_column] > 0]
+    
+    return non_0_data
 
 def remove_non_informative_rows(input_file_name: str, output_file_name: str, indicator_column: str) -> None:
     """Removes and filters the DataFrame from non informative rows. Exports clean DataFrame
@@ -23,17 +44,13 @@ def remove_non_informative_rows(input_file_name: str, output_file_name: str, ind
     n_rows: int = len(data)
     print(f"# {input_file_name} initial count of rows: {n_rows}")
     
-    print(f"# Removing NaN rows based on '{indicator_column}' variable...")
-    non_nan_data: DataFrame = data.dropna(subset=[indicator_column])
-    
-    print(f"# Removing 0 value rows based on '{indicator_column}' variable...")
-    non_0_data: DataFrame = non_nan_data[non_nan_data[indicator_column] > 0]
+    non_0_data: DataFrame = remove_non_informative(data, indicator_column)
     
     n_final_rows: int = len(non_0_data)
     print(f"# {output_file_name} final number of rows: {n_final_rows}")
     
     print(f"# Exporting {output_file_name}...")
-    non_0_data.to_csv(result_file_path, index=False)
+    write_csv(non_0_data, result_file_path)
     print(f"# {output_file_name} exported!")
     
     return
@@ -55,3 +72,61 @@ def copy_file(target_file: str, dest_file: str):
     shutil.copyfile(file_to_copy_path, copied_file_path)
     print(f"# {target_file} has been copied to {copied_file_path}!")
     return
+
+def tidy_and_clean_dataset(dataset: str, input_file_name: str, output_file_name: str, tidy_file_name: str = None, debug: bool = False) -> None:
+    """Runs the tidy (ex2) and clean stages in one pass, without writing and re-reading the tidy file
+
+    The NaN/0 filter is applied to the tidy frame in memory and the clean file is written directly.
+    The tidy file is only written if tidy_file_name is given, in a background thread while the
+    clean file is being produced.
+
+    Args:
+        dataset (str): "deaths", "population" or "nuts3"
+        input_file_name (str): input file name in raw_data
+        output_file_name (str): output file name in clean_data
+        tidy_file_name (str, optional): also export the tidy data to tidy_data with this name. Defaults to None.
+        debug (bool, optional): print the bytes copied by every tidy step. Defaults to False.
+    """
+    
+    from ex2 import get_tidy_deaths, get_tidy_population, get_tidy_nuts_catalogue
+    
+    print("-"*20)
+
+    base_path: Path = Path(__file__).parent 
+    result_file_path: Path = base_path/"clean_data"/output_file_name
+    
+    if dataset == "deaths":
+        tidy_data: DataFrame = get_tidy_deaths(input_file_name, debug)
+    elif dataset == "population":
+        tidy_data = get_tidy_population(input_file_name, debug)
+    elif dataset == "nuts3":
+        tidy_data = get_tidy_nuts_catalogue(input_file_name)
+    else:
+        raise ValueError(f"Unknown dataset '{dataset}', use 'deaths', 'population' or 'nuts3'")
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        tidy_export = None
+        if tidy_file_name is not None:
+            print(f"# Exporting {tidy_file_name} in the background...")
+            compression: str = "gzip" if dataset != "nuts3" else None
+            tidy_export = executor.submit(write_csv, tidy_data, base_path/"tidy_data"/tidy_file_name, compression)
+        
+        if dataset == "nuts3":
+            # The NUTS catalogue has no indicator: its clean file is the tidy one
+            clean_data: DataFrame = tidy_data
+        else:
+            clean_data = remove_non_informative(tidy_data, dataset)
+            # Same types as reading the tidy CSV back, so the clean files don't change format
+            clean_data = clean_data.astype({column: "int64" for column in ("year", "week") if column in clean_data.columns})
+            clean_data = clean_data.astype({dataset: "float64"})
+        
+        print(f"# {output_file_name} final number of rows: {len(clean_data)}")
+        print(f"# Exporting {output_file_name}...")
+        write_csv(clean_data, result_file_path)
+        print(f"# {output_file_name} exported!")
+        
+        if tidy_export is not None:
+            tidy_export.result()
+            print(f"# {tidy_file_name} exported!")
+    
+    return
@@ -1,5 +1,6 @@
-from pandas import DataFrame, read_csv
+from pandas import DataFrame, concat
 from pathlib import Path
+from row_index import read_head, iter_blocks
 
 
 def show_selected_columns(input_file_name: str, selected_columns: list[str]) -> DataFrame:
@@ -16,10 +17,9 @@ def show_selected_columns(input_file_name: str, selected_columns: list[str]) ->
 
     base_path: Path = Path(__file__).parent 
     file_path: Path = base_path/"clean_data"/input_file_name
-    # Reads CSV
-    deaths: DataFrame = read_csv(file_path)
-    selected_deaths: DataFrame = deaths[selected_columns]
-    return selected_deaths.head(10)
+    # Reads only the first rows through the sidecar row index
+    selected_deaths: DataFrame = read_head(file_path, 10, usecols=selected_columns)
+    return selected_deaths[selected_columns]
 
 
 def filter_rows(input_file_name: str) -> DataFrame:
@@ -38,11 +38,21 @@ def filter_rows(input_file_name: str) -> DataFrame:
 
     base_path: Path = Path(__file__).parent 
     file_path: Path = base_path/"clean_data"/input_file_name
-    # Reads CSV
-    deaths: DataFrame = read_csv(file_path)
-    # Applying mask to our df.
-    mask: DataFrame = (deaths['age'] == 'Y15-19') | (deaths['age'] == 'Y85-89')
-    result: DataFrame = deaths.loc[mask]
+    # Reads the CSV block by block (see row_index) and stops once 10 rows match
+    matches: list[DataFrame] = []
+    n_matches: int = 0
+    first_row: int = 0
+    for deaths in iter_blocks(file_path):
+        # Keep the row numbers of the whole file as index, like reading it at once
+        deaths.index = range(first_row, first_row + len(deaths))
+        first_row += len(deaths)
+        # Applying mask to our df.
+        mask: DataFrame = (deaths['age'] == 'Y15-19') | (deaths['age'] == 'Y85-89')
+        matches.append(deaths.loc[mask])
+        n_matches += int(mask.sum())
+        if n_matches >= 10:
+            break
+    result: DataFrame = concat(matches) if matches else DataFrame()
     return result.head(10)
 
 
@@ -1,9 +1,11 @@
 from pandas import DataFrame, read_csv
 from pathlib import Path 
-from matplotlib import pyplot 
+from ranking import top_k_by_group
+from result_cache import cached
 
 
-def get_top_deaths_by_city(input_filename: str, catalogue: str, by_column: str) -> DataFrame:
+@cached(inputs={"input_filename": "clean_data", "catalogue": "clean_data", "database": ("results", {"backend": "sqlite"})})
+def get_top_deaths_by_city(input_filename: str, catalogue: str, by_column: str, backend: str = "pandas", database: str = "mortality.db") -> DataFrame:
     """ Creates a ranking based on the weekly deaths on a city.
     Firstly it reads the files, merges and querys the results sorting top 10.
 
@@ -11,11 +13,20 @@ def get_top_deaths_by_city(input_filename: str, catalogue: str, by_column: str)
         input_file_name (str): Name of the deaths file inside the working directory defined.
         catalogue (str): Name of the catalogue file inside the working directory defined.
         by_column (str): Name of the column we would like to order by
+        backend (str, optional): "pandas" reads the CSV files, "sqlite" runs the query in the store
+            built by sql_store.export_to_sqlite (the file names are then ignored). Defaults to "pandas".
+        database (str, optional): SQLite store file name in results. Defaults to "mortality.db".
 
     Returns:
         top_10_deaths -> DataFrame: Returns a sorted result based on the query on the merge of the files read.
     """
 
+    if backend not in ("pandas", "sqlite"):
+        raise ValueError(f"Unknown backend '{backend}', use 'pandas' or 'sqlite'")
+    if backend == "sqlite":
+        import sql_store
+        return sql_store.get_top_deaths_by_city(by_column, year=2021, limit=10, database=database)
+
     # Getting path
     base_path: Path = Path(__file__).parent 
     deaths_path: Path = base_path/"clean_data"/input_filename
@@ -33,9 +44,8 @@ def get_top_deaths_by_city(input_filename: str, catalogue: str, by_column: str)
     deaths_2021: DataFrame = deaths_with_city.query("year == 2021")
     deaths_by_city  : DataFrame= deaths_2021.groupby([by_column]).agg({"deaths":"sum"}).reset_index()
     
-    # Sort and return top 10.
-    sorted_deaths : DataFrame = deaths_by_city.sort_values(by=["deaths"], ascending= False)
-    top_10_deaths : DataFrame = sorted_deaths.head(10)
+    # Select and return top 10 (partial selection, see ranking.rank_regions for top-k per group).
+    top_10_deaths : DataFrame = top_k_by_group(deaths_by_city, [], "deaths", k=10).drop(columns="rank")
     return top_10_deaths
 
 
@@ -56,6 +66,8 @@ def show_ranking_deaths_by_city(input_file_name: str, catalogue: str, by_column:
     Returns:
         graph: Returns a visualization of the data, displayed in bar graph
     """
+    from matplotlib import pyplot
+
     # Reading ranking.
     top_10_deaths = get_top_deaths_by_city(input_file_name, catalogue, by_column)
     # Creating graph
@@ -69,4 +81,4 @@ def show_ranking_deaths_by_city(input_file_name: str, catalogue: str, by_column:
 if __name__ == "__main__" :
 
     get_top_deaths_by_city('deaths_clean.csv', 'nuts3_clean.csv','nuts3_label')    
-    show_ranking_deaths_by_city('deaths_clean.csv','nuts3_label')
\ No newline at end of file
+    show_ranking_deaths_by_city('deaths_clean.csv', 'nuts3_clean.csv', 'nuts3_label')
\ No newline at end of file
@@ -1,15 +1,21 @@
 from pandas import DataFrame, read_csv
 from pathlib import Path 
+from result_cache import cached
 
 
 
-def get_mortality_rate(deaths_filename: str, population_filename: str, catalogue_filename: str) -> None:
+@cached(inputs={"deaths_filename": "clean_data", "population_filename": "clean_data", "catalogue_filename": "clean_data", "database": ("results", {"backend": "sqlite"})},
+        outputs=["results/mortality_rate_by_region.csv"])
+def get_mortality_rate(deaths_filename: str, population_filename: str, catalogue_filename: str, backend: str = "pandas", database: str = "mortality.db") -> None:
     """This functions reads the files, merge to unite them, filter with a query and calculate the values.
 
     Args:
         deaths_filename (str): The filename used to extract data of the deaths
         population_filename (str): The filename used to extract data of the population
         catalogue_filename (str): The filename used to extract data of the catalogue
+        backend (str, optional): "pandas" reads the CSV files, "sqlite" runs the query in the store
+            built by sql_store.export_to_sqlite (the file names are then ignored). Defaults to "pandas".
+        database (str, optional): SQLite store file name in results. Defaults to "mortality.db".
 
     Return:
         File: the result is saved on the folder Results. If everything is correct, it will print a confirmation.
@@ -17,6 +23,16 @@ def get_mortality_rate(deaths_filename: str, population_filename: str, catalogue
 
     base_path: Path = Path(__file__).parent 
 
+    if backend not in ("pandas", "sqlite"):
+        raise ValueError(f"Unknown backend '{backend}', use 'pandas' or 'sqlite'")
+    if backend == "sqlite":
+        import sql_store
+        mortality_rate_by_region: DataFrame = sql_store.get_mortality_rate(year=2021, database=database)
+        print("# Exporting mortality_rate_by_region.csv ...")
+        mortality_rate_by_region.to_csv(base_path/"results/mortality_rate_by_region.csv", index= False)
+        print("# Exported succesfully.")
+        return
+
     # Saving the paths into variables
     deaths_path: Path = base_path/"clean_data"/deaths_filename
     population_path : Path = base_path/"clean_data"/population_filename
@@ -45,7 +61,8 @@ def get_mortality_rate(deaths_filename: str, population_filename: str, catalogue
 
     # Calculating mortality_rate by 1000
     deaths_population_with_regions["mortality_rate"] = (deaths_population_with_regions["deaths"] / deaths_population_with_regions["population"]) * 1000
-    mortality_rate_by_region : DataFrame = deaths_population_with_regions[["nuts3_label","mortality_rate"]]
+    # Deaths and population are kept so the rates can get confidence intervals later (see ex7)
+    mortality_rate_by_region : DataFrame = deaths_population_with_regions[["nuts3_label","mortality_rate","deaths","population"]]
     
     #Providing a confirmation
     print("# Exporting mortality_rate_by_region.csv ...")
@@ -56,7 +73,7 @@ def get_mortality_rate(deaths_filename: str, population_filename: str, catalogue
 
 if __name__ == "__main__" :
 
-    get_mortality_rate(input_file_name = 'deaths_clean.csv', selected_columns=['deaths', 'year', 'nuts'])
+    get_mortality_rate(deaths_filename = 'deaths_clean.csv', population_filename = 'population_clean.csv', catalogue_filename = 'nuts3_clean.csv')
 
 
 
@@ -1,15 +1,20 @@
-from pandas import DataFrame, cut, read_csv
+from pandas import DataFrame, Series, cut, read_csv, concat
 from pathlib import Path 
-from matplotlib import pyplot
+from result_cache import cached
 
 
-def get_categories(deaths_file: str, ranges: list[float], categories: list[str]) -> DataFrame : 
+@cached(inputs={"deaths_file": "results"})
+def get_categories(deaths_file: str, ranges: list[float], categories: list[str], confidence_level: float = None) -> DataFrame : 
     """This function applies categories to mortality rates depending on the ranges entered and shows them in the 'mortality_cat' column
 
+    If a confidence level is given, the exact Poisson interval of each rate is computed as well and the
+    'is_uncertain' column flags the regions whose interval spans more than one category.
+
     Args:
         deaths_file (str): The file containing the deaths related data
         ranges (list[float]): The ranges that should be applied to the data in the specified column
         categories (list[str]): The names of the categories to be assigned to each of the ranges created
+        confidence_level (float, optional): confidence level of the rate intervals, e.g. 0.95. Defaults to None.
 
     Returns:
         mortality_rate (DataFrame): the output dataframe with the previous actions applied 
@@ -21,11 +26,116 @@ def get_categories(deaths_file: str, ranges: list[float], categories: list[str])
     mortality_rate: DataFrame = read_csv(mortality_rate_path, index_col = None)
     print("# Creating column 'mortality_cat' with categories for mortality rate defined ranges...")
     mortality_rate["mortality_cat"] = cut(mortality_rate.mortality_rate, ranges, right = False, labels = categories) 
+
+    if confidence_level is not None:
+        if not {"deaths", "population"}.issubset(mortality_rate.columns):
+            raise ValueError(f"{deaths_file} has no deaths and population columns, run ex6.get_mortality_rate again")
+
+        from confidence import get_garwood_interval
+
+        print("# Flagging regions with uncertain category...")
+        lower, upper = get_garwood_interval(mortality_rate["deaths"], mortality_rate["population"], alpha = 1 - confidence_level)
+        mortality_rate["rate_lower"] = lower
+        mortality_rate["rate_upper"] = upper
+        lower_cat = cut(mortality_rate.rate_lower, ranges, right = False, labels = categories)
+        upper_cat = cut(mortality_rate.rate_upper, ranges, right = False, labels = categories)
+        mortality_rate["is_uncertain"] = (lower_cat.astype(str) != upper_cat.astype(str))
+
     return mortality_rate
 
 
 
 
+def _iter_weekly_deaths(deaths_path: Path, years: list[int], chunksize: int):
+    """Yields deaths summed by region and week, one batch of finished weeks per chunk
+
+    The clean deaths file comes out of a melt on year_week, so the rows of a week are contiguous. The
+    sums of the last week of a chunk are carried to the next chunk, and only one week of partial sums
+    is held at a time.
+    """
+
+    carried: DataFrame = None
+    finished_weeks: set[str] = set()
+
+    for chunk in read_csv(deaths_path, usecols=["nuts", "year_week", "year", "week", "deaths"], chunksize=chunksize):
+        chunk = chunk[chunk["week"] != 99]
+        if years is not None:
+            chunk = chunk[chunk["year"].isin(years)]
+        if chunk.empty:
+            continue
+        if finished_weeks.intersection(chunk["year_week"].unique()):
+            raise ValueError(f"{deaths_path.name} is not grouped by year_week, it cannot be read in a single pass")
+
+        sums: DataFrame = chunk.groupby(["year_week", "nuts", "year"], sort=False)["deaths"].sum().reset_index()
+        if carried is not None:
+            sums = concat([carried, sums]).groupby(["year_week", "nuts", "year"], sort=False)["deaths"].sum().reset_index()
+
+        last_week: str = chunk["year_week"].iloc[-1]
+        is_open: Series = sums["year_week"] == last_week
+        carried = sums[is_open]
+        finished_weeks.update(sums.loc[~is_open, "year_week"].unique())
+        yield sums[~is_open]
+
+    if carried is not None:
+        yield carried
+
+
+def get_quantile_ranges(deaths_file: str, population_file: str, quantiles: list[float], period: str = "week", years: list[int] = None, k: int = 200, chunksize: int = 500_000) -> list[float]:
+    """Category boundaries at the given quantiles of the mortality rates, computed in a single pass
+
+    The rates (deaths per 1000 inhabitants, by region and week or by region and year) are streamed into
+    a KLL sketch instead of being materialized and sorted. With the default k=200 the rank of every
+    boundary is within about 1.65% of the requested quantile (99% confidence); the sketch keeps about
+    3k values whatever the input size. See sketches.py.
+
+    Args:
+        deaths_file (str): deaths file in clean_data
+        population_file (str): population file in clean_data
+        quantiles (list[float]): probabilities of the inner boundaries, e.g. [1/3, 2/3] for three categories
+        period (str, optional): "week" for weekly rates over regions x weeks x years (undated deaths,
+            week 99, left out), "year" for annual rates over regions x years with every death counted
+            (the scale of ex6's mortality_rate_by_region.csv). Defaults to "week".
+        years (list[int], optional): years to include, all of them if None. Defaults to None.
+        k (int, optional): sketch accuracy parameter. Defaults to 200.
+        chunksize (int, optional): rows read at a time. Defaults to 500_000.
+
+    Returns:
+        ranges (list[float]): 0, the boundaries and infinity, ready for get_categories
+    """
+
+    from ranking import sum_by_region
+    from sketches import KLLSketch, HyperLogLog
+
+    if period not in ("week", "year"):
+        raise ValueError(f"Unknown period '{period}', use 'week' or 'year'")
+
+    base_path: Path = Path(__file__).parent
+    deaths_path: Path = base_path/"clean_data"/deaths_file
+
+    print("# Summing population by region...")
+    population: DataFrame = sum_by_region(base_path/"clean_data"/population_file, "population", years, chunksize)
+
+    if period == "week":
+        batches = _iter_weekly_deaths(deaths_path, years, chunksize)
+    else:
+        batches = [sum_by_region(deaths_path, "deaths", years, chunksize)]
+
+    print(f"# Streaming {period}ly mortality rates into the sketch...")
+    sketch: KLLSketch = KLLSketch(k)
+    regions: HyperLogLog = HyperLogLog()
+    for batch in batches:
+        batch = batch.merge(population, how="inner", on=["nuts", "year"])
+        sketch.update((batch["deaths"] / batch["population"]).to_numpy() * 1000)
+        regions.update(batch["nuts"])
+
+    print(f"# {sketch.n} rates from about {regions.count():.0f} regions")
+    boundaries: list[float] = [float(value) for value in sketch.quantiles(quantiles)]
+
+    return [0.0] + boundaries + [float("inf")]
+
+
+
+
 def show_mortality_rates(filename: str, ranges: list[float], categories: list[str]) -> None:
     """This function shows a bars graph containing the amount of regions that fall in each mortality rate category.
 
@@ -34,6 +144,8 @@ def show_mortality_rates(filename: str, ranges: list[float], categories: list[st
         ranges (list[float]): The ranges that should be applied to the data in the specified column
         categories (list[str]): The names of the categories to be assigned to each of the ranges created
     """
+    from matplotlib import pyplot
+
     print("# Generating graph...")
     mortality_cat: DataFrame = get_categories(filename, ranges, categories)
     categories_count: DataFrame = mortality_cat.groupby(["mortality_cat"]).size().reset_index(name = "Regions count")
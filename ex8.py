@@ -1,9 +1,10 @@
 from pandas import DataFrame, to_datetime, read_csv
 from pathlib import Path 
-from matplotlib import pyplot as plt
+from result_cache import cached
 
 
-def get_deaths_by_week(deaths_file: str, catalogue_file: str, population_file: str) -> DataFrame: 
+@cached(inputs={"deaths_file": "clean_data", "catalogue_file": "clean_data", "population_file": "clean_data", "database": ("results", {"backend": "sqlite"})})
+def get_deaths_by_week(deaths_file: str, catalogue_file: str, population_file: str, backend: str = "pandas", database: str = "mortality.db") -> DataFrame: 
     """This function merges a deaths dataframe with its corresponding catalogue dataframe of regions as well as 
     its corresponding population dataframe into a new dataframe. 
 
@@ -15,12 +16,23 @@ def get_deaths_by_week(deaths_file: str, catalogue_file: str, population_file: s
         deaths_file (str): The file containing the deaths related data
         catalogue_file (str): The file containing the corresponding regions catalogue
         population_file (str): The file containing the corresponding population file
+        backend (str, optional): "pandas" reads the CSV files, "sqlite" runs the aggregations in the store
+            built by sql_store.export_to_sqlite (the file names are then ignored). Defaults to "pandas".
+        database (str, optional): SQLite store file name in results. Defaults to "mortality.db".
 
     Returns:
         deaths_population (DataFrame): The resulting dataframe with the mortality rate data, organized by country 
         and week of the year, correctly formatted.
     """
 
+    if backend not in ("pandas", "sqlite"):
+        raise ValueError(f"Unknown backend '{backend}', use 'pandas' or 'sqlite'")
+    if backend == "sqlite":
+        import sql_store
+        deaths_population: DataFrame = sql_store.get_deaths_by_week(database=database)
+        deaths_population['date'] = to_datetime(deaths_population["year_week"] + "-1", format = "%GW%V-%u", errors = "ignore")
+        return deaths_population
+
     base_path: Path = Path(__file__).parent 
     # Create deaths dataframe
     print("# Generating deaths dataframe from files...")
@@ -79,6 +91,8 @@ def show_mortality_rates_by_week(deaths_file: str, catalogue_file: str, populati
         countries_list (list): The list of countries defined to be compared
     """
 
+    from matplotlib import pyplot as plt
+
     # Get dataframe with the deaths by week data
     mortality_time_series: DataFrame = get_deaths_by_week(deaths_file, catalogue_file, population_file)
     # Search the defined countries to be compared in the dataframe and retrieve their data
@@ -94,6 +108,6 @@ def show_mortality_rates_by_week(deaths_file: str, catalogue_file: str, populati
 
 if __name__ == "__main__" :
 
-    show_mortality_rates_by_week("deaths_clean.csv", "nuts3_clean.csv", "population_clean.csv, ['España', 'France', 'Portugal', 'Italia', 'Deutschland', 'Suomi/Finland']")
+    show_mortality_rates_by_week("deaths_clean.csv", "nuts3_clean.csv", "population_clean.csv", ['España', 'France', 'Portugal', 'Italia', 'Deutschland', 'Suomi/Finland'])
 
 
@@ -28,5 +28,5 @@ def merge_dataframes(deaths_file: str, nuts_file: str):
 
 if __name__ == "__main__" :
 
-    merge_dataframes()
+    merge_dataframes('deaths_clean.csv', 'nuts3_clean.csv')
 
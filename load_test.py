@@ -0,0 +1,119 @@
+"""Load test of service.py: throughput and latency percentiles
+
+Opens a number of keep-alive connections against a running service and has each one send requests
+back to back, picked at random from a mix of queries. A part of the mix repeats the same queries so the
+cache and the request coalescing get exercised.
+
+    python service.py &
+    python load_test.py --connections 50 --requests 2000
+"""
+from argparse import ArgumentParser
+from urllib.parse import quote
+import asyncio
+import random
+import statistics
+import time
+
+QUERIES: list[str] = [
+    "/mortality?level=nuts3&year=2021",
+    "/mortality?level=country&year=2020&format=csv",
+    "/top?level=nuts3&year=2021&k=10&by=rate",
+    "/top?level=nuts2&year=2020&k=5&by=deaths&order=asc",
+    f"/weekly?country={quote('España')}&country=France",
+    f"/weekly?country={quote('Deutschland')}&format=csv",
+]
+
+
+async def send_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, target: str, host: str) -> int:
+    """Sends one GET on an open connection and reads the whole response
+
+    Args:
+        reader (asyncio.StreamReader): connection reader
+        writer (asyncio.StreamWriter): connection writer
+        target (str): path and query string
+        host (str): Host header
+
+    Returns:
+        status (int): HTTP status code
+    """
+
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+
+    status: int = int((await reader.readline()).split()[1])
+    content_length: int = 0
+    while True:
+        line: bytes = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            content_length = int(value)
+    await reader.readexactly(content_length)
+
+    return status
+
+
+async def run_connection(host: str, port: int, n_requests: int, latencies: list[float], errors: list[int], seed: int) -> None:
+    """One client connection sending n_requests requests sequentially"""
+
+    rng: random.Random = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(n_requests):
+            target: str = rng.choice(QUERIES)
+            start: float = time.perf_counter()
+            status: int = await send_request(reader, writer, target, host)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_load_test(host: str = "127.0.0.1", port: int = 8000, connections: int = 50, requests: int = 2000) -> dict[str, float]:
+    """Runs the load test and returns its summary
+
+    Args:
+        host (str, optional): service host. Defaults to "127.0.0.1".
+        port (int, optional): service port. Defaults to 8000.
+        connections (int, optional): concurrent connections. Defaults to 50.
+        requests (int, optional): total requests, split between the connections. Defaults to 2000.
+
+    Returns:
+        summary (dict[str, float]): requests, errors, throughput (req/s) and p50/p99 latency (ms)
+    """
+
+    latencies: list[float] = []
+    errors: list[int] = []
+    per_connection: int = max(requests // connections, 1)
+
+    start: float = time.perf_counter()
+    await asyncio.gather(*(run_connection(host, port, per_connection, latencies, errors, seed) for seed in range(connections)))
+    elapsed: float = time.perf_counter() - start
+
+    percentiles: list[float] = statistics.quantiles(latencies, n=100)
+    summary: dict[str, float] = {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": percentiles[49] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+    }
+
+    return summary
+
+
+if __name__ == "__main__" :
+
+    parser = ArgumentParser(description="Load test of the mortality query service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_load_test(args.host, args.port, args.connections, args.requests))
+    print(f"# {summary['requests']} requests, {summary['errors']} errors")
+    print(f"# Throughput: {summary['throughput']:.0f} req/s")
+    print(f"# Latency p50: {summary['p50_ms']:.1f} ms, p99: {summary['p99_ms']:.1f} ms")
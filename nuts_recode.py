@@ -0,0 +1,257 @@
+"""Recoding of regional data between NUTS versions (e.g. NUTS 2016 -> NUTS 2021)
+
+Each country reports the weekly deaths and the population in the NUTS version it uses, while the
+catalogue is NUTS 2021. The Eurostat change table (sheet 'NUTS2016-NUTS2021' of the NUTS 2021
+workbook, see create_raw_data.get_nuts_changes) gives the source -> target pairs of the regions that
+changed. It becomes a sparse (source regions x target regions) matrix W, and a whole dataset is
+converted with one product X @ W, where X has one row per key (sex, age, week...) and one column
+per source region.
+
+A source region split into several target regions is shared by the population of the targets,
+equally when it is unknown. Merged regions are summed. Boundary shifts with several sources and
+targets are approximated by the same share.
+
+The shares only use population reported in the target version (see get_target_weights): a country
+that still reports NUTS 2016 has no population for the new NUTS 2021 regions its splits go to, so
+those splits fall back to equal shares unless a population in the target version is given.
+"""
+from pandas import DataFrame, Index, MultiIndex, Series, read_csv
+from pathlib import Path
+from scipy import sparse
+import numpy as np
+from row_index import write_csv
+
+
+def load_nuts_changes(input_file_name: str = "nuts_changes.csv", source: str = "2016", target: str = "2021") -> DataFrame:
+    """Reads the NUTS-3 pairs of the Eurostat change table
+
+    Args:
+        input_file_name (str, optional): change table in raw_data. Defaults to "nuts_changes.csv".
+        source (str, optional): version of the codes to convert. Defaults to "2016".
+        target (str, optional): version to convert to. Defaults to "2021".
+
+    Returns:
+        changes (DataFrame): source_code and target_code, NaN target for discontinued regions and
+        NaN source for new ones
+    """
+
+    file_path: Path = Path(__file__).parent/"raw_data"/input_file_name
+
+    print(f"# Reading NUTS changes: '{input_file_name}'...")
+    data: DataFrame = read_csv(file_path, index_col=None, compression="gzip", dtype=str)
+    data = data.rename(columns=lambda x: x.strip())
+
+    changes: DataFrame = data.rename(columns={f"Code {source}": "source_code", f"Code {target}": "target_code"})
+    changes = changes[["source_code", "target_code"]].apply(lambda col: col.str.strip())
+    is_nuts3: Series = (changes["source_code"].str.len() == 5) | (changes["target_code"].str.len() == 5)
+
+    return changes[is_nuts3].drop_duplicates().reset_index(drop=True)
+
+
+def get_version_codes(changes: DataFrame, catalogue_codes: Index, catalogue_is_target: bool = True) -> Index:
+    """NUTS-3 codes of the target version
+
+    Args:
+        changes (DataFrame): output of load_nuts_changes
+        catalogue_codes (Index): codes of the catalogue (nuts3_code of nuts3_clean.csv, NUTS 2021)
+        catalogue_is_target (bool, optional): whether the catalogue is in the target version. If not
+            (e.g. 2021 -> 2016), the changed catalogue codes are replaced by the target codes of the
+            change table. Defaults to True.
+
+    Returns:
+        codes (Index): sorted target codes
+    """
+
+    catalogue_codes = Index(catalogue_codes)
+    if catalogue_is_target:
+        return catalogue_codes.sort_values()
+
+    unchanged: Index = catalogue_codes.difference(Index(changes["source_code"].dropna()))
+
+    return unchanged.union(Index(changes["target_code"].dropna().unique())).sort_values()
+
+
+def get_source_countries(region_codes: Index, changes: DataFrame, target_codes: Index) -> list[str]:
+    """Countries that report in the source version
+
+    A country is taken as a source-version reporter when some of its codes are source codes of the
+    change table and not valid target codes.
+
+    Args:
+        region_codes (Index): codes present in the data
+        changes (DataFrame): output of load_nuts_changes
+        target_codes (Index): codes of the target version
+
+    Returns:
+        countries (list[str]): two-letter country codes
+    """
+
+    region_codes = Index(region_codes)
+    is_source_only: np.ndarray = region_codes.isin(changes["source_code"].dropna()) & ~region_codes.isin(target_codes)
+
+    return sorted(region_codes[is_source_only].str.slice(0, 2).unique())
+
+
+def get_target_weights(population: DataFrame, changes: DataFrame, target_codes: Index, region_col: str = "nuts") -> Series:
+    """Population by target code, to share the split regions
+
+    Only the countries reporting in the target version are used: in a source-version country a code
+    can be reused with other borders, and the new target regions have no population at all.
+
+    Args:
+        population (DataFrame): clean population data, at least region_col and population
+        changes (DataFrame): output of load_nuts_changes
+        target_codes (Index): codes of the target version, see get_version_codes
+        region_col (str, optional): region code column. Defaults to "nuts".
+
+    Returns:
+        weights (Series): summed population by target code
+    """
+
+    target_codes = Index(target_codes)
+    region_codes: Index = Index(population[region_col].unique())
+    source_countries: list[str] = get_source_countries(region_codes, changes, target_codes)
+
+    in_target_version: Series = population[region_col].isin(target_codes) & ~population[region_col].str.slice(0, 2).isin(source_countries)
+
+    return population[in_target_version].groupby(region_col)["population"].sum()
+
+
+def get_mapping_matrix(source_codes: Index, target_codes: Index, changes: DataFrame, source_countries: list[str], weights: Series = None) -> tuple[sparse.csr_matrix, Index]:
+    """Sparse source -> target matrix, every mapped row sums to 1
+
+    Regions of source_countries go through the change table. Every other region whose code is a
+    target code maps to itself.
+
+    Args:
+        source_codes (Index): codes present in the data (the rows)
+        target_codes (Index): codes of the target version (the columns)
+        changes (DataFrame): output of load_nuts_changes
+        source_countries (list[str]): countries reporting in the source version
+        weights (Series, optional): population by target code, to share split regions. Defaults to None.
+
+    Returns:
+        mapping (sparse.csr_matrix): (len(source_codes), len(target_codes)) shares
+        unmapped (Index): source codes with no target (discontinued or unknown)
+    """
+
+    in_source_version: np.ndarray = source_codes.str.slice(0, 2).isin(source_countries)
+    changed: np.ndarray = source_codes.isin(changes["source_code"].dropna())
+    pairs: DataFrame = changes.dropna()
+    pairs = pairs[pairs["source_code"].isin(source_codes[in_source_version & changed])]
+
+    # Regions that did not change (or whose country already reports the target version) keep their code
+    kept: Index = source_codes[~(in_source_version & changed)]
+    rows: np.ndarray = np.concatenate([source_codes.get_indexer(pairs["source_code"]), source_codes.get_indexer(kept)])
+    cols: np.ndarray = np.concatenate([target_codes.get_indexer(pairs["target_code"]), target_codes.get_indexer(kept)])
+    valid: np.ndarray = cols >= 0
+    rows, cols = rows[valid], cols[valid]
+
+    target_weights: np.ndarray = np.ones(len(cols))
+    if weights is not None:
+        target_weights = weights.reindex(target_codes[cols]).fillna(0).to_numpy(dtype=np.float64)
+    totals: np.ndarray = np.bincount(rows, weights=target_weights, minlength=len(source_codes))
+    counts: np.ndarray = np.bincount(rows, minlength=len(source_codes))
+    shares: np.ndarray = np.where(totals[rows] > 0, target_weights / np.where(totals[rows] > 0, totals[rows], 1), 1 / counts[rows])
+
+    mapping: sparse.csr_matrix = sparse.csr_matrix((shares, (rows, cols)), shape=(len(source_codes), len(target_codes)))
+
+    return mapping, source_codes[counts == 0]
+
+
+def recode_regions(data: DataFrame, value_cols: list[str], changes: DataFrame, target_codes: Index, weights: Series = None, source_countries: list[str] = None, region_col: str = "nuts") -> tuple[DataFrame, DataFrame]:
+    """Converts a clean dataset to the target NUTS version with one sparse product per value column
+
+    Args:
+        data (DataFrame): clean deaths or population data
+        value_cols (list[str]): additive columns, e.g. ["deaths"] or ["population"]
+        changes (DataFrame): output of load_nuts_changes
+        target_codes (Index): codes of the target version, see get_version_codes
+        weights (Series, optional): population by target code, to share split regions. Defaults to None.
+        source_countries (list[str], optional): countries to recode, detected if None. Defaults to None.
+        region_col (str, optional): region code column. Defaults to "nuts".
+
+    Returns:
+        recoded (DataFrame): the data in the target version (is_provisional is True if any source row was)
+        unmapped (DataFrame): the dropped source codes with their summed value columns
+    """
+
+    target_codes = Index(target_codes)
+    key_cols: list[str] = [col for col in data.columns if col not in value_cols + [region_col, "is_provisional"]]
+
+    key_ids, keys = MultiIndex.from_frame(data[key_cols]).factorize()
+    region_ids, source_codes = data[region_col].factorize()
+    source_codes = Index(source_codes)
+
+    if source_countries is None:
+        source_countries = get_source_countries(source_codes, changes, target_codes)
+    print(f"# Recoding regions of {', '.join(source_countries) or 'no country'}...")
+    mapping, unmapped_codes = get_mapping_matrix(source_codes, target_codes, changes, source_countries, weights)
+
+    shape: tuple[int, int] = (len(keys), len(source_codes))
+    presence: sparse.coo_matrix = (sparse.csr_matrix((np.ones(len(data)), (key_ids, region_ids)), shape=shape) @ mapping).tocoo()
+
+    # Cells are read at the positions of 'presence' so the zero values are kept
+    recoded: DataFrame = keys.to_frame(index=False, name=key_cols).iloc[presence.row].reset_index(drop=True)
+    recoded[region_col] = target_codes[presence.col]
+    for col in value_cols:
+        values: np.ndarray = data[col].to_numpy(dtype=np.float64, na_value=0.0)
+        product: sparse.csr_matrix = sparse.csr_matrix((values, (key_ids, region_ids)), shape=shape) @ mapping
+        recoded[col] = np.asarray(product[presence.row, presence.col]).ravel()
+    if "is_provisional" in data.columns:
+        flags: np.ndarray = data["is_provisional"].to_numpy(dtype=np.float64)
+        product = sparse.csr_matrix((flags, (key_ids, region_ids)), shape=shape) @ (mapping > 0).astype(np.float64)
+        recoded["is_provisional"] = np.asarray(product[presence.row, presence.col]).ravel() > 0
+
+    unmapped: DataFrame = data[data[region_col].isin(unmapped_codes)].groupby(region_col)[value_cols].sum().reset_index()
+    if not unmapped.empty:
+        print(f"# {len(unmapped)} regions could not be mapped: {', '.join(unmapped[region_col])}")
+
+    return recoded[list(data.columns)], unmapped
+
+
+def recode_clean_dataset(input_file_name: str, output_file_name: str, value_col: str, catalogue_file: str = "nuts3_clean.csv", changes_file: str = "nuts_changes.csv", population_file: str = "population_clean.csv", source: str = "2016", target: str = "2021") -> DataFrame:
+    """Recodes a clean dataset to one NUTS version and writes it to clean_data
+
+    Split regions are shared by the population of their targets, taken from the target-version
+    countries of population_file (see get_target_weights), equally when it is unknown.
+
+    Args:
+        input_file_name (str): clean deaths or population file in clean_data
+        output_file_name (str): output file in clean_data
+        value_col (str): "deaths" or "population"
+        catalogue_file (str, optional): NUTS 2021 catalogue in clean_data. Defaults to "nuts3_clean.csv".
+        changes_file (str, optional): change table in raw_data. Defaults to "nuts_changes.csv".
+        population_file (str, optional): population file in clean_data, None for equal shares. Defaults to "population_clean.csv".
+        source (str, optional): version to convert from. Defaults to "2016".
+        target (str, optional): version to convert to. Defaults to "2021".
+
+    Returns:
+        unmapped (DataFrame): the dropped source codes with their summed values
+    """
+
+    clean_path: Path = Path(__file__).parent/"clean_data"
+
+    changes: DataFrame = load_nuts_changes(changes_file, source, target)
+    catalogue: DataFrame = read_csv(clean_path/catalogue_file)
+    target_codes: Index = get_version_codes(changes, catalogue["nuts3_code"], catalogue_is_target=(target == "2021"))
+
+    weights: Series = None
+    if population_file is not None:
+        population: DataFrame = read_csv(clean_path/population_file, usecols=["nuts", "population"])
+        weights = get_target_weights(population, changes, target_codes)
+
+    print(f"# Reading dataset: '{input_file_name}'...")
+    data: DataFrame = read_csv(clean_path/input_file_name)
+    recoded, unmapped = recode_regions(data, [value_col], changes, target_codes, weights)
+
+    print(f"# Exporting {output_file_name}...")
+    write_csv(recoded, clean_path/output_file_name)
+
+    return unmapped
+
+
+if __name__ == "__main__" :
+
+    recode_clean_dataset("deaths_clean.csv", "deaths_clean_nuts2021.csv", "deaths")
+    recode_clean_dataset("population_clean.csv", "population_clean_nuts2021.csv", "population")
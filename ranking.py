@@ -0,0 +1,214 @@
+from pandas import DataFrame, read_csv, concat
+from pathlib import Path
+import heapq
+import numpy as np
+
+# Catalogue columns of each NUTS level, used both for the ranked regions and for the groups
+LEVELS: dict[str, tuple[str, str]] = {
+    "nuts3": ("nuts3_code", "nuts3_label"),
+    "nuts2": ("nuts2_code", "nuts2_label"),
+    "nuts1": ("nuts1_code", "nuts1_label"),
+    "country": ("country_code", "country_label"),
+}
+
+
+def top_k_by_group(data: DataFrame, group_cols: list[str], value_col: str, k: int = 5, ascending: bool = False) -> DataFrame:
+    """Top (or bottom) k rows of every group, with a partial selection per group instead of a full sort
+
+    Args:
+        data (DataFrame): input data
+        group_cols (list[str]): columns defining the groups, an empty list ranks the whole table
+        value_col (str): column to rank by
+        k (int, optional): rows kept per group. Defaults to 5.
+        ascending (bool, optional): keep the k smallest values instead of the largest. Defaults to False.
+
+    Returns:
+        top (DataFrame): the selected rows with their original index labels, sorted within each group,
+        with a 'rank' column (1 = first)
+    """
+
+    values: np.ndarray = data[value_col].to_numpy(dtype=np.float64)
+    # Always select the smallest keys; NaN keys end up last in argpartition and argsort
+    keys: np.ndarray = values if ascending else -values
+
+    if group_cols:
+        groups = data.groupby(group_cols, sort=True, dropna=False).indices.values()
+    else:
+        groups = [np.arange(len(data))]
+
+    selected: list[np.ndarray] = []
+    for rows in groups:
+        if len(rows) > k:
+            rows = rows[np.argpartition(keys[rows], k - 1)[:k]]
+        selected.append(rows[np.argsort(keys[rows], kind="stable")])
+
+    if not selected:
+        return data.head(0).assign(rank=np.array([], dtype=np.int64))
+
+    top: DataFrame = data.iloc[np.concatenate(selected)].assign(
+        rank=np.concatenate([np.arange(1, len(rows) + 1) for rows in selected]))
+
+    return top
+
+
+def top_k_by_group_chunked(chunks, group_cols: list[str], value_col: str, k: int = 5, ascending: bool = False) -> DataFrame:
+    """Same as top_k_by_group over an iterable of chunks, keeping a bounded heap of k rows per group
+
+    Every chunk is first reduced to its own top k per group (vectorized), so at most k rows per group
+    and chunk go through the heaps. Memory is bounded by k x number of groups, not by the input size.
+    Missing group keys form one group, like groupby(dropna=False) in top_k_by_group.
+
+    Args:
+        chunks (Iterable[DataFrame]): chunks with the same columns, e.g. read_csv(..., chunksize=n)
+        group_cols (list[str]): columns defining the groups, an empty list ranks the whole input
+        value_col (str): column to rank by
+        k (int, optional): rows kept per group. Defaults to 5.
+        ascending (bool, optional): keep the k smallest values instead of the largest. Defaults to False.
+
+    Returns:
+        top (DataFrame): the selected rows with their original index labels, sorted by group and then
+        within each group, with a 'rank' column (1 = first)
+    """
+
+    heaps: dict[tuple, list[tuple]] = {}
+    columns: list[str] = None
+    # Heap entries are (priority, sequence, label, row): the root is the weakest row kept for the group.
+    # The sequence number makes ties keep the first row seen, like top_k_by_group.
+    sign: float = -1.0 if ascending else 1.0
+    sequence: int = 0
+
+    for chunk in chunks:
+        columns = list(chunk.columns)
+        reduced: DataFrame = top_k_by_group(chunk, group_cols, value_col, k, ascending).drop(columns="rank")
+        group_positions: list[int] = [columns.index(col) for col in group_cols]
+        value_position: int = columns.index(value_col)
+
+        for label, *row in reduced.itertuples(index=True, name=None):
+            value: float = row[value_position]
+            if value != value:
+                continue
+            # NaN != NaN, so every missing key would be a group of its own: use None instead
+            key: tuple = tuple(None if row[position] != row[position] else row[position] for position in group_positions)
+            entry: tuple = (sign * value, -sequence, label, tuple(row))
+            sequence += 1
+            heap: list[tuple] = heaps.setdefault(key, [])
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    if columns is None:
+        return DataFrame()
+
+    labels: list = []
+    rows: list[tuple] = []
+    ranks: list[int] = []
+    for heap in heaps.values():
+        ordered: list[tuple] = sorted(heap, reverse=True)
+        labels.extend(entry[2] for entry in ordered)
+        rows.extend(entry[3] for entry in ordered)
+        ranks.extend(range(1, len(ordered) + 1))
+
+    top: DataFrame = DataFrame(rows, columns=columns, index=labels).assign(rank=ranks)
+    if group_cols:
+        top = top.sort_values(group_cols + ["rank"], kind="stable", na_position="last")
+
+    return top
+
+
+def sum_by_region(file_path: Path, value_col: str, years: list[int], chunksize: int) -> DataFrame:
+    """Sums a clean file by NUTS-3 region and year reading it in chunks
+
+    Undated deaths (week 99) count in the annual totals, like in ex5 and ex6.
+
+    Args:
+        file_path (Path): clean deaths or population file
+        value_col (str): "deaths" or "population"
+        years (list[int]): years to keep, all of them if None
+        chunksize (int): rows read at a time
+
+    Returns:
+        totals (DataFrame): nuts, year and the summed value column
+    """
+
+    partial_sums: list[DataFrame] = []
+
+    for chunk in read_csv(file_path, usecols=["nuts", "year", value_col], chunksize=chunksize):
+        if years is not None:
+            chunk = chunk[chunk["year"].isin(years)]
+        partial_sums.append(chunk.groupby(["nuts", "year"])[value_col].sum())
+        # Keep the running total small: fold the partial sums every few chunks
+        if len(partial_sums) >= 16:
+            partial_sums = [concat(partial_sums).groupby(level=["nuts", "year"]).sum()]
+
+    if not partial_sums:
+        return DataFrame(columns=["nuts", "year", value_col])
+
+    return concat(partial_sums).groupby(level=["nuts", "year"]).sum().reset_index()
+
+
+def rank_regions(deaths_file: str, catalogue_file: str, population_file: str = None, region_level: str = "nuts3", group_level: str = "country", years: list[int] = None, k: int = 5, by: str = "deaths", ascending: bool = False, chunksize: int = 500_000) -> DataFrame:
+    """Top-k (or bottom-k) regions within each group, e.g. top 5 NUTS-3 regions per country and year
+
+    The clean files are read in chunks and reduced to sums by region and year on the fly, so the
+    input never has to fit in memory.
+
+    Args:
+        deaths_file (str): deaths file in clean_data
+        catalogue_file (str): NUTS-3 catalogue file in clean_data
+        population_file (str, optional): population file in clean_data, needed when by="rate". Defaults to None.
+        region_level (str, optional): level of the ranked regions. Defaults to "nuts3".
+        group_level (str, optional): level of the groups, None to rank only by year. Defaults to "country".
+        years (list[int], optional): years to rank, all of them if None. Defaults to None.
+        k (int, optional): regions per group. Defaults to 5.
+        by (str, optional): 'deaths' or 'rate'. Defaults to "deaths".
+        ascending (bool, optional): bottom k instead of top k. Defaults to False.
+        chunksize (int, optional): rows read at a time. Defaults to 500_000.
+
+    Returns:
+        ranking (DataFrame): group code and label, year, region code and label, deaths (and population,
+        mortality_rate) and rank
+    """
+
+    if by not in ("deaths", "rate"):
+        raise ValueError(f"Unknown ranking '{by}', use 'deaths' or 'rate'")
+    if by == "rate" and population_file is None:
+        raise ValueError("A population file is needed to rank by rate")
+
+    base_path: Path = Path(__file__).parent
+    region_code, region_label = LEVELS[region_level]
+    group_cols: list[str] = list(LEVELS[group_level]) if group_level is not None else []
+
+    print("# Summing deaths by region...")
+    totals: DataFrame = sum_by_region(base_path/"clean_data"/deaths_file, "deaths", years, chunksize)
+    if by == "rate":
+        print("# Summing population by region...")
+        population: DataFrame = sum_by_region(base_path/"clean_data"/population_file, "population", years, chunksize)
+        totals = totals.merge(population, how="left", on=["nuts", "year"])
+
+    catalogue: DataFrame = read_csv(base_path/"clean_data"/catalogue_file)
+    totals = totals.merge(catalogue, how="left", left_on="nuts", right_on="nuts3_code")
+
+    value_cols: list[str] = ["deaths"] + (["population"] if by == "rate" else [])
+    keys: list[str] = list(dict.fromkeys(group_cols + ["year", region_code, region_label]))
+    by_region: DataFrame = totals.groupby(keys, dropna=False)[value_cols].sum(min_count=1).reset_index()
+
+    value_col: str = "deaths"
+    if by == "rate":
+        # Regions without population rows would get an infinite rate and rank first
+        by_region = by_region[by_region["population"] > 0]
+        by_region = by_region.assign(mortality_rate=(by_region["deaths"] / by_region["population"]) * 1000)
+        value_col = "mortality_rate"
+
+    # A region's rows are spread over the whole file, so the selection runs on the complete region
+    # totals, fed in chunks: only the top k candidates of each group are kept from every chunk
+    print(f"# Selecting top {k} {region_level} regions by {by}...")
+    chunks = (by_region.iloc[start:start + chunksize] for start in range(0, len(by_region), chunksize))
+    ranking: DataFrame = top_k_by_group_chunked(chunks, list(dict.fromkeys(group_cols + ["year"])), value_col, k, ascending)
+
+    return ranking
+
+
+if __name__ == "__main__" :
+
+    print(rank_regions("deaths_clean.csv", "nuts3_clean.csv", "population_clean.csv", years=[2021], k=5, by="rate"))
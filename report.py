@@ -0,0 +1,237 @@
+import matplotlib
+matplotlib.use("Agg")
+
+from pandas import DataFrame
+from pandas.util import hash_pandas_object
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import json
+import numpy as np
+
+
+def downsample_lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling, keeps the visual shape of a long series
+
+    Args:
+        x (np.ndarray): x values, sorted and numeric
+        y (np.ndarray): y values
+        n_out (int): number of points to keep
+
+    Returns:
+        selected (np.ndarray): indices of the kept points, first and last always included
+    """
+
+    n_in: int = len(x)
+    if n_out >= n_in or n_out < 3:
+        return np.arange(n_in)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # n_out - 2 buckets between the fixed first and last points
+    edges: np.ndarray = np.linspace(1, n_in - 1, n_out - 1).astype(np.int64)
+    selected: np.ndarray = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n_in - 1
+
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_start, next_stop = stop, (edges[bucket + 2] if bucket + 2 < len(edges) else n_in)
+
+        # The next bucket is represented by its average point
+        avg_x: float = x[next_start:next_stop].mean()
+        avg_y: float = y[next_start:next_stop].mean()
+        prev_x, prev_y = x[selected[bucket]], y[selected[bucket]]
+
+        areas: np.ndarray = np.abs((prev_x - avg_x) * (y[start:stop] - prev_y) - (prev_x - x[start:stop]) * (avg_y - prev_y))
+        selected[bucket + 1] = start + int(np.argmax(areas))
+
+    return selected
+
+
+def get_data_hash(data: DataFrame, **params) -> str:
+    """Content hash of a chart: the plotted data plus every rendering parameter
+
+    Args:
+        data (DataFrame): plotted data
+        **params: chart options (kind, columns, title...)
+
+    Returns:
+        digest (str): sha256 hex digest
+    """
+
+    digest = hashlib.sha256(hash_pandas_object(data, index=True).to_numpy().tobytes())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+
+    return digest.hexdigest()
+
+
+def render_chart(data: DataFrame, file_path: str, kind: str, x: str, y: str, title: str = None, series: str = None, max_points: int = 60) -> str:
+    """Draws one chart and writes it to disk, without any interactive window
+
+    Args:
+        data (DataFrame): data to plot
+        file_path (str): output path, the extension (.png, .svg) selects the format
+        kind (str): 'line' or 'bar'
+        x (str): column for the x axis
+        y (str): column for the y axis
+        title (str, optional): chart title. Defaults to None.
+        series (str, optional): column to draw one line per value. Defaults to None.
+        max_points (int, optional): line series longer than this are downsampled with LTTB, e.g. the ~105
+            weeks of 2020-2021. Defaults to 60.
+
+    Returns:
+        file_path (str): the written file
+    """
+
+    from matplotlib import pyplot as plt
+
+    fig, ax = plt.subplots()
+    groups = data.groupby(series) if series is not None else [(title, data)]
+
+    for key, grp in groups:
+        if kind == "line":
+            grp = grp.sort_values(x)
+            x_values: np.ndarray = grp[x].to_numpy()
+            y_values: np.ndarray = grp[y].to_numpy(dtype=np.float64)
+            numeric_x: np.ndarray = x_values.astype("datetime64[ns]").astype(np.int64) if np.issubdtype(x_values.dtype, np.datetime64) else x_values
+            keep: np.ndarray = downsample_lttb(numeric_x, y_values, max_points)
+            ax.plot(x_values[keep], y_values[keep], label=key)
+        else:
+            ax.bar(grp[x].astype(str), grp[y], label=key)
+            ax.tick_params(axis="x", labelrotation=90)
+
+    if series is not None:
+        ax.legend()
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    if title is not None:
+        ax.set_title(title)
+
+    fig.tight_layout()
+    fig.savefig(file_path)
+    plt.close(fig)
+
+    return file_path
+
+
+def render_charts(jobs: list[dict], output_dir: str = "results/charts", fmt: str = "png", n_workers: int = None) -> list[str]:
+    """Renders a batch of charts in a process pool, skipping the ones whose data hash has not changed
+
+    Args:
+        jobs (list[dict]): one dict per chart with 'name', 'data' and the render_chart options
+        output_dir (str, optional): folder for the charts, relative to the project. Defaults to "results/charts".
+        fmt (str, optional): 'png' or 'svg'. Defaults to "png".
+        n_workers (int, optional): processes to use. Defaults to the number of cores.
+
+    Returns:
+        rendered (list[str]): files written in this call
+    """
+
+    base_path: Path = Path(__file__).parent
+    output_path: Path = base_path/output_dir
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    manifest_path: Path = output_path/"manifest.json"
+    manifest: dict = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+    pending: list[tuple[str, str, dict]] = []
+    for job in jobs:
+        options: dict = {key: value for key, value in job.items() if key not in ("name", "data")}
+        file_name: str = f"{job['name']}.{fmt}"
+        data_hash: str = get_data_hash(job["data"], **options)
+
+        if manifest.get(file_name) == data_hash and (output_path/file_name).exists():
+            continue
+        pending.append((file_name, data_hash, job))
+
+    print(f"# Rendering {len(pending)} charts ({len(jobs) - len(pending)} unchanged)...")
+    # The manifest is written even if a chart fails, so the charts already rendered are not redone
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures: dict = {}
+            for file_name, data_hash, job in pending:
+                chart_options: dict = {key: value for key, value in job.items() if key != "name"}
+                futures[executor.submit(render_chart, file_path=str(output_path/file_name), **chart_options)] = (file_name, data_hash)
+
+            for future in as_completed(futures):
+                file_name, data_hash = futures[future]
+                future.result()
+                manifest[file_name] = data_hash
+    finally:
+        manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+
+    return [str(output_path/file_name) for file_name, _, _ in pending]
+
+
+def render_weekly_report(deaths_file: str, catalogue_file: str, population_file: str, output_dir: str = "results/charts", fmt: str = "png", n_workers: int = None) -> list[str]:
+    """Writes one weekly mortality rate chart per country (see ex8.get_deaths_by_week)
+
+    Args:
+        deaths_file (str): The file containing the deaths related data
+        catalogue_file (str): The file containing the corresponding regions catalogue
+        population_file (str): The file containing the corresponding population file
+        output_dir (str, optional): folder for the charts, relative to the project. Defaults to "results/charts".
+        fmt (str, optional): 'png' or 'svg'. Defaults to "png".
+        n_workers (int, optional): processes to use. Defaults to the number of cores.
+
+    Returns:
+        rendered (list[str]): files written in this call
+    """
+
+    from ex8 import get_deaths_by_week
+
+    mortality_time_series: DataFrame = get_deaths_by_week(deaths_file, catalogue_file, population_file)
+
+    jobs: list[dict] = []
+    for key, grp in mortality_time_series.groupby("country_label"):
+        safe_name: str = "".join(char if char.isalnum() else "_" for char in str(key))
+        jobs.append({
+            "name": f"weekly_{safe_name}",
+            "data": grp[["date", "mortality_rate"]].reset_index(drop=True),
+            "kind": "line",
+            "x": "date",
+            "y": "mortality_rate",
+            "title": str(key),
+        })
+
+    return render_charts(jobs, output_dir, fmt, n_workers)
+
+
+def render_summary_report(deaths_file: str, catalogue_file: str, mortality_file: str, ranges: list[float], categories: list[str], output_dir: str = "results/charts", fmt: str = "png", n_workers: int = None) -> list[str]:
+    """Writes the deaths ranking (ex5) and the mortality categories (ex7) charts
+
+    Args:
+        deaths_file (str): The file containing the deaths related data
+        catalogue_file (str): The file containing the corresponding regions catalogue
+        mortality_file (str): The file containing the mortality rates by region (see ex6)
+        ranges (list[float]): The ranges of the mortality rate categories
+        categories (list[str]): The names of the mortality rate categories
+        output_dir (str, optional): folder for the charts, relative to the project. Defaults to "results/charts".
+        fmt (str, optional): 'png' or 'svg'. Defaults to "png".
+        n_workers (int, optional): processes to use. Defaults to the number of cores.
+
+    Returns:
+        rendered (list[str]): files written in this call
+    """
+
+    from ex5 import get_top_deaths_by_city
+    from ex7 import get_categories
+
+    top_10_deaths: DataFrame = get_top_deaths_by_city(deaths_file, catalogue_file, "nuts3_label")
+    mortality_cat: DataFrame = get_categories(mortality_file, ranges, categories)
+    categories_count: DataFrame = mortality_cat.groupby(["mortality_cat"]).size().reset_index(name = "Regions count")
+
+    jobs: list[dict] = [
+        {"name": "ranking_deaths_by_city", "data": top_10_deaths, "kind": "bar", "x": "nuts3_label", "y": "deaths"},
+        {"name": "mortality_categories", "data": categories_count, "kind": "bar", "x": "mortality_cat", "y": "Regions count"},
+    ]
+
+    return render_charts(jobs, output_dir, fmt, n_workers)
+
+
+if __name__ == "__main__" :
+
+    render_weekly_report("deaths_clean.csv", "nuts3_clean.csv", "population_clean.csv")
+    render_summary_report("deaths_clean.csv", "nuts3_clean.csv", "mortality_rate_by_region.csv", [0, 9, 12, 100], ["Below average", "Average", "Over average"])
@@ -0,0 +1,293 @@
+"""On-disk result cache for the analysis entry points (ex5 to ex8)
+
+    @cached(inputs={"deaths_file": "clean_data"}, outputs=["results/some_output.csv"])
+    def get_something(deaths_file: str, year: int = 2021) -> DataFrame: ...
+
+The key of a call is a hash of the function name and source, its bound arguments (defaults included)
+and the content fingerprints of its input files, so a call is recomputed when any of them changes.
+Only the decorated function's own source is hashed: after editing a helper it calls, run invalidate().
+
+Entries are pickled (protocol 5, no extra dependency) in results/.cache, together with the bytes of
+the files the function writes, which are put back on a hit when they are missing or different.
+
+Content fingerprints are BLAKE2b digests, remembered by path, size and mtime so an unchanged file is
+only hashed once. The cache is bounded by MAX_CACHE_BYTES and evicts the least recently used entries.
+"""
+from pathlib import Path
+from functools import wraps
+from typing import Callable
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import threading
+import time
+
+CACHE_DIR: Path = Path(__file__).parent/"results"/".cache"
+MAX_CACHE_BYTES: int = 512 * 1024**2
+
+_lock: threading.Lock = threading.Lock()
+_stats: dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _load_json(file_path: Path) -> dict:
+    """Reads a JSON file of the cache folder, empty if it is missing or unreadable"""
+
+    try:
+        return json.loads(file_path.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_json(file_path: Path, content: dict) -> None:
+    """Writes a JSON file of the cache folder atomically (other processes may be reading it)"""
+
+    temporary_path: Path = file_path.with_suffix(f".{os.getpid()}.tmp")
+    temporary_path.write_text(json.dumps(content))
+    os.replace(temporary_path, file_path)
+
+
+def get_fingerprint(file_path: Path) -> str:
+    """Content digest of a file, None if it does not exist
+
+    Args:
+        file_path (Path): input file
+
+    Returns:
+        fingerprint (str): BLAKE2b hex digest of the file content
+    """
+
+    file_path = Path(file_path).resolve()
+    if not file_path.exists():
+        return None
+
+    stat = file_path.stat()
+    known: dict = _load_json(CACHE_DIR/"fingerprints.json")
+    entry: dict = known.get(str(file_path))
+    if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["digest"]
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as file:
+        while block := file.read(1024**2):
+            digest.update(block)
+
+    with _lock:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        known = _load_json(CACHE_DIR/"fingerprints.json")
+        known[str(file_path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest.hexdigest()}
+        _save_json(CACHE_DIR/"fingerprints.json", known)
+
+    return digest.hexdigest()
+
+
+def get_code_fingerprint(function: Callable) -> str:
+    """Digest of a function's source, so editing the function invalidates its entries
+
+    Args:
+        function (Callable): cached function
+
+    Returns:
+        fingerprint (str): BLAKE2b hex digest of the source (of the bytecode if the source is unavailable)
+    """
+
+    try:
+        code: bytes = inspect.getsource(function).encode()
+    except (OSError, TypeError):
+        code = function.__code__.co_code
+
+    return hashlib.blake2b(code, digest_size=16).hexdigest()
+
+
+def get_cache_key(name: str, code: str, arguments: dict, fingerprints: dict) -> str:
+    """Hash of a call
+
+    Args:
+        name (str): qualified function name
+        code (str): fingerprint of the function's source, see get_code_fingerprint
+        arguments (dict): bound arguments, defaults included
+        fingerprints (dict): fingerprint of every input file
+
+    Returns:
+        key (str): hex digest identifying the call
+    """
+
+    description: str = json.dumps({"function": name, "code": code, "arguments": arguments, "inputs": fingerprints}, sort_keys=True, default=repr)
+
+    return hashlib.blake2b(description.encode(), digest_size=16).hexdigest()
+
+
+def evict(max_bytes: int = None) -> int:
+    """Removes the least recently used entries until the cache fits in max_bytes
+
+    Args:
+        max_bytes (int, optional): size limit. Defaults to MAX_CACHE_BYTES.
+
+    Returns:
+        n_evicted (int): number of entries removed
+    """
+
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+
+    with _lock:
+        index: dict = _load_json(CACHE_DIR/"index.json")
+        total_bytes: int = sum(entry["size"] for entry in index.values())
+        n_evicted: int = 0
+        for key, entry in sorted(index.items(), key=lambda item: item[1]["last_access"]):
+            if total_bytes <= max_bytes:
+                break
+            (CACHE_DIR/f"{key}.pkl").unlink(missing_ok=True)
+            total_bytes -= entry["size"]
+            del index[key]
+            n_evicted += 1
+        if n_evicted:
+            _save_json(CACHE_DIR/"index.json", index)
+            _stats["evictions"] += n_evicted
+
+    return n_evicted
+
+
+def invalidate(function: str = None) -> int:
+    """Removes the entries of a function, or every entry
+
+    Args:
+        function (str, optional): qualified name, e.g. "ex6.get_mortality_rate", None for all. Defaults to None.
+
+    Returns:
+        n_removed (int): number of entries removed
+    """
+
+    with _lock:
+        index: dict = _load_json(CACHE_DIR/"index.json")
+        removed: list[str] = [key for key, entry in index.items() if function is None or entry["function"] == function]
+        for key in removed:
+            (CACHE_DIR/f"{key}.pkl").unlink(missing_ok=True)
+            del index[key]
+        if removed:
+            _save_json(CACHE_DIR/"index.json", index)
+
+    return len(removed)
+
+
+def get_stats() -> dict:
+    """Hit/miss counts of this process and current size of the cache
+
+    Returns:
+        stats (dict): hits, misses, evictions, hit_rate, entries and size_mb
+    """
+
+    index: dict = _load_json(CACHE_DIR/"index.json")
+    calls: int = _stats["hits"] + _stats["misses"]
+
+    return {**_stats, "hit_rate": _stats["hits"] / calls if calls else 0.0, "entries": len(index),
+            "size_mb": sum(entry["size"] for entry in index.values()) / 1024**2}
+
+
+def _restore_outputs(outputs: dict[str, bytes]) -> None:
+    """Writes back the cached output files that are missing or differ from the cached content"""
+
+    base_path: Path = Path(__file__).parent
+    for relative_path, content in outputs.items():
+        output_path: Path = base_path/relative_path
+        if output_path.exists() and output_path.stat().st_size == len(content) and output_path.read_bytes() == content:
+            continue
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_bytes(content)
+
+
+def _get_input_paths(inputs: dict, arguments: dict) -> dict[str, Path]:
+    """Paths of the input files a call actually reads
+
+    Args:
+        inputs (dict): see cached
+        arguments (dict): bound arguments of the call
+
+    Returns:
+        paths (dict[str, Path]): argument name -> file path
+    """
+
+    base_path: Path = Path(__file__).parent
+    paths: dict[str, Path] = {}
+
+    for argument, spec in inputs.items():
+        folder, condition = (spec, {}) if isinstance(spec, str) else spec
+        if arguments.get(argument) is None:
+            continue
+        if any(arguments.get(name) != value for name, value in condition.items()):
+            continue
+        paths[argument] = base_path/folder/arguments[argument]
+
+    return paths
+
+
+def cached(inputs: dict, outputs: list[str] = None) -> Callable:
+    """Caches the results of a function on disk
+
+    Args:
+        inputs (dict): argument name -> folder (relative to the project) of every input file argument.
+            The folder can come with the argument values under which the file is read, e.g.
+            {"database": ("results", {"backend": "sqlite"})}: the store is only fingerprinted for
+            sqlite calls, so rebuilding it keeps the pandas entries.
+        outputs (list[str], optional): files (relative to the project) the function writes. Defaults to None.
+
+    Returns:
+        decorator (Callable): the decorator, the wrapped function gets an 'invalidate' attribute
+    """
+
+    outputs = outputs or []
+    base_path: Path = Path(__file__).parent
+
+    def decorator(function: Callable) -> Callable:
+        name: str = f"{function.__module__}.{function.__qualname__}"
+        signature: inspect.Signature = inspect.signature(function)
+        code: str = get_code_fingerprint(function)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            bound: inspect.BoundArguments = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            fingerprints: dict[str, str] = {argument: get_fingerprint(file_path)
+                                            for argument, file_path in _get_input_paths(inputs, bound.arguments).items()}
+            key: str = get_cache_key(name, code, bound.arguments, fingerprints)
+            entry_path: Path = CACHE_DIR/f"{key}.pkl"
+
+            try:
+                with open(entry_path, "rb") as file:
+                    payload: dict = pickle.load(file)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                payload = None
+
+            if payload is not None:
+                print(f"# Loaded {function.__name__} from cache")
+                _restore_outputs(payload["outputs"])
+                with _lock:
+                    _stats["hits"] += 1
+                    index: dict = _load_json(CACHE_DIR/"index.json")
+                    if key in index:
+                        index[key]["last_access"] = time.time()
+                        _save_json(CACHE_DIR/"index.json", index)
+                return payload["result"]
+
+            result = function(*args, **kwargs)
+
+            payload = {"result": result, "outputs": {path: (base_path/path).read_bytes() for path in outputs if (base_path/path).exists()}}
+            content: bytes = pickle.dumps(payload, protocol=5)
+            with _lock:
+                _stats["misses"] += 1
+                CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                temporary_path: Path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+                temporary_path.write_bytes(content)
+                os.replace(temporary_path, entry_path)
+                index = _load_json(CACHE_DIR/"index.json")
+                index[key] = {"function": name, "size": len(content), "last_access": time.time()}
+                _save_json(CACHE_DIR/"index.json", index)
+            evict()
+
+            return result
+
+        wrapper.invalidate = lambda: invalidate(name)
+
+        return wrapper
+
+    return decorator
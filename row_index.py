@@ -0,0 +1,357 @@
+"""Sidecar row-offset index for the stage CSV files
+
+Next to every file written with write_csv there is a '<file>.idx.json' with the byte offset of every
+N-th data row. Plain files are seekable at any checkpoint. Gzip files are written as one gzip member per
+block of N rows (standard gzip readers read the concatenation unchanged), so each checkpoint is the
+compressed offset of a member that can be decompressed on its own.
+
+Previews, heads, tails and random samples then only decompress and parse the blocks they need.
+The index assumes one row per line, which holds for the files of this project.
+"""
+from pandas import DataFrame, read_csv
+from pathlib import Path
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from io import StringIO
+import gzip
+import json
+import os
+import numpy as np
+
+
+def get_index_path(file_path: Path) -> Path:
+    """Sidecar index location of a data file
+
+    Args:
+        file_path (Path): data file
+
+    Returns:
+        index_path (Path): '<file>.idx.json' in the same folder
+    """
+
+    return Path(f"{file_path}.idx.json")
+
+
+def is_gzip_file(file_path: Path) -> bool:
+    """Checks the gzip magic number, some stage files are gzip with a .csv extension"""
+
+    with open(file_path, "rb") as file:
+        return file.read(2) == b"\x1f\x8b"
+
+
+def _file_signature(file_path: Path) -> dict:
+    """Size and modification time, used to detect an index that no longer matches its file"""
+
+    stat = Path(file_path).stat()
+
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _write_index(file_path: Path, header: str, every: int, n_rows: int, checkpoints: list[list[int]], compressed: bool) -> dict:
+    """Writes the sidecar index of file_path and returns it"""
+
+    index: dict = {"header": header, "every": every, "n_rows": n_rows, "compressed": compressed,
+                   "checkpoints": checkpoints, **_file_signature(file_path)}
+    get_index_path(file_path).write_text(json.dumps(index))
+
+    return index
+
+
+def compress_block(text: str, compresslevel: int = 6) -> bytes:
+    """Compresses a block of CSV text as a standalone gzip member
+
+    Args:
+        text (str): CSV lines
+        compresslevel (int, optional): gzip level. Defaults to 6.
+
+    Returns:
+        member (bytes): gzip member, mtime fixed to 0 so the output is reproducible
+    """
+
+    return gzip.compress(text.encode("utf8"), compresslevel=compresslevel, mtime=0)
+
+
+def encode_block(block: DataFrame, compressed: bool, compresslevel: int = 6) -> bytes:
+    """Formats a block of rows as CSV lines (no header) and compresses it if needed
+
+    Module level so it can run in a process pool as well as in a thread pool.
+
+    Args:
+        block (DataFrame): rows to format
+        compressed (bool): return a gzip member instead of plain text
+        compresslevel (int, optional): gzip level. Defaults to 6.
+
+    Returns:
+        encoded (bytes): the bytes to append to the file
+    """
+
+    text: str = block.to_csv(index=False, header=False)
+
+    return compress_block(text, compresslevel) if compressed else text.encode("utf8")
+
+
+def iter_encoded_blocks(data: DataFrame, every: int, compressed: bool, compresslevel: int = 6, n_workers: int = None, executor: str = "process"):
+    """Encodes the blocks of 'every' rows in a pool, yielding them in file order
+
+    Only a window of 2 x n_workers blocks is in flight, so memory does not grow with the file.
+    The to_csv formatting holds the GIL and takes about half of the time of a block, so the default
+    "process" pool runs both formatting and compression in worker processes, at the cost of pickling
+    every block. With "thread" only the compression runs in parallel: gzip.compress calls zlib.compress,
+    which runs deflate with the GIL released (CPython's zlibmodule.c wraps it in Py_BEGIN_ALLOW_THREADS),
+    so the speedup is capped at about 2x.
+
+    Args:
+        data (DataFrame): data to export
+        every (int): rows per block
+        compressed (bool): gzip each block as its own member
+        compresslevel (int, optional): gzip level. Defaults to 6.
+        n_workers (int, optional): pool size, 1 to encode in the calling thread. Defaults to the number of cores.
+        executor (str, optional): "process" or "thread". Defaults to "process".
+
+    Yields:
+        encoded (bytes): encoded blocks in row order
+    """
+
+    starts: range = range(0, len(data), every)
+    n_workers = n_workers or os.cpu_count() or 1
+
+    if n_workers == 1 or len(starts) <= 1:
+        for start in starts:
+            yield encode_block(data.iloc[start:start + every], compressed, compresslevel)
+        return
+
+    pool_class = ThreadPoolExecutor if executor == "thread" else ProcessPoolExecutor
+    with pool_class(max_workers=n_workers) as pool:
+        pending: deque = deque()
+        for start in starts:
+            pending.append(pool.submit(encode_block, data.iloc[start:start + every], compressed, compresslevel))
+            if len(pending) >= 2 * n_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_csv(data: DataFrame, file_path: Path, compression: str = None, every: int = 10_000, compresslevel: int = 6, n_workers: int = None, executor: str = "process") -> dict:
+    """Writes a DataFrame as CSV (optionally gzip) together with its sidecar row index
+
+    The blocks are formatted and compressed in parallel (see iter_encoded_blocks). Gzip output is a
+    concatenation of members that decompresses to the same text as to_csv(compression="gzip").
+
+    Args:
+        data (DataFrame): data to export
+        file_path (Path): output file
+        compression (str, optional): None or "gzip". Defaults to None.
+        every (int, optional): rows between two checkpoints. Defaults to 10_000.
+        compresslevel (int, optional): gzip level. Defaults to 6.
+        n_workers (int, optional): pool size, 1 to write sequentially. Defaults to the number of cores.
+        executor (str, optional): "process" or "thread". Defaults to "process".
+
+    Returns:
+        index (dict): the written index
+    """
+
+    header: str = data.head(0).to_csv(index=False)
+    checkpoints: list[list[int]] = []
+    compressed: bool = compression == "gzip"
+
+    with open(file_path, "wb") as file:
+        if compressed:
+            file.write(compress_block(header, compresslevel))
+        else:
+            file.write(header.encode("utf8"))
+
+        for position, block in enumerate(iter_encoded_blocks(data, every, compressed, compresslevel, n_workers, executor)):
+            checkpoints.append([file.tell(), position * every])
+            file.write(block)
+
+    return _write_index(file_path, header.rstrip("\r\n"), every, len(data), checkpoints, compressed)
+
+
+def build_row_index(file_path: Path, every: int = 10_000) -> dict:
+    """Builds the sidecar index of an existing file by scanning it once
+
+    Plain files get a checkpoint every 'every' rows. Existing gzip files are usually a single member,
+    so they only get a checkpoint at the start of the file; rewrite them with write_csv to get the others.
+
+    Args:
+        file_path (Path): data file
+        every (int, optional): rows between two checkpoints. Defaults to 10_000.
+
+    Returns:
+        index (dict): the written index
+    """
+
+    compressed: bool = is_gzip_file(file_path)
+    opener = gzip.open if compressed else open
+    checkpoints: list[list[int]] = []
+    n_rows: int = 0
+
+    with opener(file_path, "rb") as file:
+        header: str = file.readline().decode("utf8").rstrip("\r\n")
+        offset: int = file.tell()
+        for line in file:
+            if n_rows % every == 0 and (n_rows == 0 or not compressed):
+                # Offset 0 means the header line comes before the first row of the checkpoint
+                checkpoints.append([0 if compressed else offset, n_rows])
+            offset += len(line)
+            n_rows += 1
+
+    return _write_index(file_path, header, every, n_rows, checkpoints, compressed)
+
+
+def get_row_index(file_path: Path, every: int = 10_000) -> dict:
+    """Loads the sidecar index of a file, (re)building it if missing or stale
+
+    Args:
+        file_path (Path): data file
+        every (int, optional): rows between checkpoints if it has to be built. Defaults to 10_000.
+
+    Returns:
+        index (dict): the row index
+    """
+
+    index_path: Path = get_index_path(file_path)
+    if index_path.exists():
+        index: dict = json.loads(index_path.read_text())
+        if all(index.get(key) == value for key, value in _file_signature(file_path).items()):
+            return index
+
+    return build_row_index(file_path, every)
+
+
+def _iter_lines(file_path: Path, index: dict, checkpoint: int):
+    """Yields the raw data lines of a file starting at a checkpoint"""
+
+    offset, _ = index["checkpoints"][checkpoint]
+
+    with open(file_path, "rb") as raw_file:
+        raw_file.seek(offset)
+        # Gzip members after the offset are read on as one stream
+        file = gzip.GzipFile(fileobj=raw_file, mode="rb") if index["compressed"] else raw_file
+        if offset == 0:
+            file.readline()
+        for line in file:
+            yield line
+
+
+def _parse_lines(index: dict, lines: list[bytes], **kwargs) -> DataFrame:
+    """Parses data lines with the file header"""
+
+    text: str = index["header"] + "\n" + b"".join(lines).decode("utf8")
+
+    return read_csv(StringIO(text), **kwargs)
+
+
+def read_rows(file_path: Path, row_numbers: list[int], **kwargs) -> DataFrame:
+    """Reads the given data rows only, seeking to the nearest checkpoint of each one
+
+    Args:
+        file_path (Path): data file
+        row_numbers (list[int]): 0-based data row numbers
+        **kwargs: extra read_csv arguments (usecols, dtype...)
+
+    Returns:
+        rows (DataFrame): the rows in ascending row order
+    """
+
+    index: dict = get_row_index(file_path)
+    wanted: np.ndarray = np.unique(np.asarray(row_numbers, dtype=np.int64))
+    wanted = wanted[(wanted >= 0) & (wanted < index["n_rows"])]
+    first_rows: list[int] = [row for _, row in index["checkpoints"]]
+
+    lines: list[bytes] = []
+    position: int = 0
+    while position < len(wanted):
+        checkpoint: int = bisect_right(first_rows, wanted[position]) - 1
+        next_checkpoint_row: int = first_rows[checkpoint + 1] if checkpoint + 1 < len(first_rows) else index["n_rows"]
+
+        row: int = first_rows[checkpoint]
+        for line in _iter_lines(file_path, index, checkpoint):
+            if row == wanted[position]:
+                lines.append(line)
+                position += 1
+                # Stop this pass when done or when the next wanted row is closer from its own checkpoint
+                if position == len(wanted) or wanted[position] >= next_checkpoint_row:
+                    break
+            row += 1
+        else:
+            raise ValueError(f"{file_path} has fewer rows than its index says, delete {get_index_path(file_path).name}")
+
+    return _parse_lines(index, lines, **kwargs)
+
+
+def read_head(file_path: Path, n_rows: int = 10, **kwargs) -> DataFrame:
+    """First rows of a file, parsing only those rows
+
+    Args:
+        file_path (Path): data file
+        n_rows (int, optional): number of rows. Defaults to 10.
+        **kwargs: extra read_csv arguments
+
+    Returns:
+        head (DataFrame): the first n_rows rows
+    """
+
+    return read_rows(file_path, range(n_rows), **kwargs)
+
+
+def read_tail(file_path: Path, n_rows: int = 10, **kwargs) -> DataFrame:
+    """Last rows of a file, starting from the last checkpoint before them
+
+    Args:
+        file_path (Path): data file
+        n_rows (int, optional): number of rows. Defaults to 10.
+        **kwargs: extra read_csv arguments
+
+    Returns:
+        tail (DataFrame): the last n_rows rows
+    """
+
+    total_rows: int = get_row_index(file_path)["n_rows"]
+
+    return read_rows(file_path, range(max(total_rows - n_rows, 0), total_rows), **kwargs)
+
+
+def sample_rows(file_path: Path, n_rows: int = 10, random_state: int = None, **kwargs) -> DataFrame:
+    """Uniform random sample of rows without replacement, parsing only the sampled rows
+
+    Args:
+        file_path (Path): data file
+        n_rows (int, optional): sample size. Defaults to 10.
+        random_state (int, optional): seed for a reproducible sample. Defaults to None.
+        **kwargs: extra read_csv arguments
+
+    Returns:
+        sample (DataFrame): the sampled rows, in file order
+    """
+
+    total_rows: int = get_row_index(file_path)["n_rows"]
+    rng: np.random.Generator = np.random.default_rng(random_state)
+    row_numbers: np.ndarray = rng.choice(total_rows, size=min(n_rows, total_rows), replace=False)
+
+    return read_rows(file_path, row_numbers, **kwargs)
+
+
+def iter_blocks(file_path: Path, **kwargs):
+    """Iterates over the file one checkpoint block at a time
+
+    Args:
+        file_path (Path): data file
+        **kwargs: extra read_csv arguments
+
+    Yields:
+        block (DataFrame): the rows between two checkpoints
+    """
+
+    index: dict = get_row_index(file_path)
+    first_rows: list[int] = [row for _, row in index["checkpoints"]] + [index["n_rows"]]
+
+    for checkpoint in range(len(index["checkpoints"])):
+        block_size: int = first_rows[checkpoint + 1] - first_rows[checkpoint]
+        lines: list[bytes] = []
+        for line in _iter_lines(file_path, index, checkpoint):
+            lines.append(line)
+            if len(lines) == block_size:
+                break
+        yield _parse_lines(index, lines, **kwargs)
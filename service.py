@@ -0,0 +1,309 @@
+"""Local asyncio HTTP service over the precomputed mortality aggregates
+
+The clean data is read once at startup and reduced to small aggregates (deaths and population by
+NUTS-3 region and year, deaths by country and week). Requests are answered from them:
+
+    GET /mortality?level=nuts3&year=2021[&format=csv]
+    GET /top?level=nuts3&year=2021&k=10&by=rate[&order=asc]
+    GET /weekly?country=España[&country=France][&format=csv]
+    GET /health
+
+Identical concurrent requests share one computation, finished responses go to an LRU cache and the
+pandas work runs in a thread pool so the event loop keeps accepting connections.
+
+    python service.py --port 8000
+"""
+from pandas import DataFrame, read_csv, to_datetime
+from pathlib import Path
+from argparse import ArgumentParser
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+import asyncio
+import json
+
+LEVELS: dict[str, tuple[str, str]] = {
+    "nuts3": ("nuts3_code", "nuts3_label"),
+    "nuts2": ("nuts2_code", "nuts2_label"),
+    "nuts1": ("nuts1_code", "nuts1_label"),
+    "country": ("country_code", "country_label"),
+}
+
+ENDPOINTS: tuple[str, ...] = ("/mortality", "/top", "/weekly")
+
+REASONS: dict[int, str] = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def load_aggregates(deaths_file: str = "deaths_clean.csv", population_file: str = "population_clean.csv", catalogue_file: str = "nuts3_clean.csv") -> dict[str, DataFrame]:
+    """Reads the clean data once and keeps only the aggregates the endpoints need
+
+    Args:
+        deaths_file (str, optional): deaths file in clean_data. Defaults to "deaths_clean.csv".
+        population_file (str, optional): population file in clean_data. Defaults to "population_clean.csv".
+        catalogue_file (str, optional): NUTS-3 catalogue file in clean_data. Defaults to "nuts3_clean.csv".
+
+    Returns:
+        aggregates (dict[str, DataFrame]): 'regions' (deaths and population by NUTS-3 and year with every
+        catalogue column) and 'weekly' (deaths, population and rate by country and week)
+    """
+
+    base_path: Path = Path(__file__).parent
+    print("# Loading clean data...")
+    deaths: DataFrame = read_csv(base_path/"clean_data"/deaths_file, usecols=["nuts", "year", "week", "year_week", "deaths"])
+    population: DataFrame = read_csv(base_path/"clean_data"/population_file, usecols=["nuts", "year", "population"])
+    catalogue: DataFrame = read_csv(base_path/"clean_data"/catalogue_file)
+
+    print("# Precomputing aggregates...")
+    deaths_by_region: DataFrame = deaths.groupby(["nuts", "year"]).agg({"deaths": "sum"}).reset_index()
+    population_by_region: DataFrame = population.groupby(["nuts", "year"]).agg({"population": "sum"}).reset_index()
+    regions: DataFrame = deaths_by_region.merge(population_by_region, how="left", on=["nuts", "year"])
+    regions = regions.merge(catalogue, how="left", left_on="nuts", right_on="nuts3_code")
+
+    # Undated deaths (week 99) count in the annual totals but not in the weekly series
+    deaths_by_week: DataFrame = deaths.query("week != 99").merge(catalogue[["nuts3_code", "country_label"]], how="left", left_on="nuts", right_on="nuts3_code")
+    weekly: DataFrame = deaths_by_week.groupby(["country_label", "year_week", "year"]).agg({"deaths": "sum"}).reset_index()
+    population_by_country: DataFrame = regions.groupby(["country_label", "year"]).agg({"population": "sum"}).reset_index()
+    weekly = weekly.merge(population_by_country, how="left", on=["country_label", "year"])
+    weekly["mortality_rate"] = (weekly["deaths"] / weekly["population"]) * 1000
+    weekly["date"] = to_datetime(weekly["year_week"] + "-1", format="%GW%V-%u", errors="coerce").dt.strftime("%Y-%m-%d")
+
+    return {"regions": regions, "weekly": weekly}
+
+
+def get_mortality(aggregates: dict[str, DataFrame], level: str = "nuts3", year: int = 2021) -> DataFrame:
+    """Mortality rate by region of the given NUTS level and year
+
+    Args:
+        aggregates (dict[str, DataFrame]): see load_aggregates
+        level (str, optional): nuts3, nuts2, nuts1 or country. Defaults to "nuts3".
+        year (int, optional): year of the rates. Defaults to 2021.
+
+    Returns:
+        mortality (DataFrame): code, label, deaths, population and mortality_rate
+    """
+
+    if level not in LEVELS:
+        raise ValueError(f"Unknown level '{level}', use one of {', '.join(LEVELS)}")
+    code, label = LEVELS[level]
+
+    regions: DataFrame = aggregates["regions"]
+    regions = regions[regions["year"] == year]
+    mortality: DataFrame = regions.groupby([code, label])[["deaths", "population"]].sum(min_count=1).reset_index()
+    # Regions without population rows would get an infinite rate and come first in /top
+    mortality = mortality[mortality["population"] > 0]
+    mortality = mortality.assign(mortality_rate=(mortality["deaths"] / mortality["population"]) * 1000)
+
+    return mortality
+
+
+def get_top(aggregates: dict[str, DataFrame], level: str = "nuts3", year: int = 2021, k: int = 10, by: str = "rate", ascending: bool = False) -> DataFrame:
+    """Top (or bottom) k regions by deaths or mortality rate
+
+    Args:
+        aggregates (dict[str, DataFrame]): see load_aggregates
+        level (str, optional): nuts3, nuts2, nuts1 or country. Defaults to "nuts3".
+        year (int, optional): year to rank. Defaults to 2021.
+        k (int, optional): number of regions. Defaults to 10.
+        by (str, optional): 'rate' or 'deaths'. Defaults to "rate".
+        ascending (bool, optional): bottom k instead of top k. Defaults to False.
+
+    Returns:
+        top (DataFrame): the k regions, sorted
+    """
+
+    if by not in ("rate", "deaths"):
+        raise ValueError(f"Unknown ranking '{by}', use 'rate' or 'deaths'")
+    if k < 1:
+        raise ValueError(f"Invalid k '{k}', use a positive number of regions")
+    column: str = "mortality_rate" if by == "rate" else "deaths"
+
+    mortality: DataFrame = get_mortality(aggregates, level, year)
+    top: DataFrame = mortality.nsmallest(k, column) if ascending else mortality.nlargest(k, column)
+
+    return top
+
+
+def get_weekly(aggregates: dict[str, DataFrame], countries: list[str]) -> DataFrame:
+    """Weekly mortality rate series of some countries
+
+    Args:
+        aggregates (dict[str, DataFrame]): see load_aggregates
+        countries (list[str]): country labels, all of them if empty
+
+    Returns:
+        weekly (DataFrame): country_label, year_week, date, deaths, population and mortality_rate
+    """
+
+    weekly: DataFrame = aggregates["weekly"]
+    if countries:
+        weekly = weekly[weekly["country_label"].isin(countries)]
+
+    return weekly[["country_label", "year_week", "date", "deaths", "population", "mortality_rate"]]
+
+
+def render_response(data: DataFrame, fmt: str) -> tuple[bytes, str]:
+    """Serializes a result frame
+
+    Args:
+        data (DataFrame): result
+        fmt (str): 'json' or 'csv'
+
+    Returns:
+        body, content_type (tuple[bytes, str]): encoded body and its content type
+    """
+
+    if fmt == "csv":
+        return data.to_csv(index=False).encode("utf8"), "text/csv; charset=utf-8"
+    if fmt == "json":
+        return data.to_json(orient="records", force_ascii=False).encode("utf8"), "application/json; charset=utf-8"
+
+    raise ValueError(f"Unknown format '{fmt}', use 'json' or 'csv'")
+
+
+class QueryService:
+    """Answers the endpoint queries with coalescing of in-flight requests and an LRU response cache"""
+
+    def __init__(self, aggregates: dict[str, DataFrame], cache_size: int = 256, workers: int = 4):
+        self.aggregates: dict[str, DataFrame] = aggregates
+        self.cache: OrderedDict[tuple, tuple[bytes, str]] = OrderedDict()
+        self.cache_size: int = cache_size
+        self.in_flight: dict[tuple, asyncio.Future] = {}
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=workers)
+        self.stats: dict[str, int] = {"requests": 0, "cache_hits": 0, "coalesced": 0, "computed": 0}
+
+    def compute(self, path: str, params: dict[str, list[str]]) -> tuple[bytes, str]:
+        """Runs one query, called in the thread pool"""
+
+        fmt: str = params.get("format", ["json"])[0]
+
+        if path == "/mortality":
+            result: DataFrame = get_mortality(self.aggregates, params.get("level", ["nuts3"])[0], int(params.get("year", ["2021"])[0]))
+        elif path == "/top":
+            result = get_top(self.aggregates, params.get("level", ["nuts3"])[0], int(params.get("year", ["2021"])[0]),
+                             int(params.get("k", ["10"])[0]), params.get("by", ["rate"])[0], params.get("order", ["desc"])[0] == "asc")
+        else:
+            result = get_weekly(self.aggregates, params.get("country", []))
+
+        return render_response(result, fmt)
+
+    async def query(self, path: str, params: dict[str, list[str]]) -> tuple[bytes, str]:
+        """Answers a query from the cache, from an identical request in flight, or by computing it
+
+        Args:
+            path (str): endpoint path
+            params (dict[str, list[str]]): query string parameters
+
+        Returns:
+            body, content_type (tuple[bytes, str]): encoded response
+        """
+
+        self.stats["requests"] += 1
+        key: tuple = (path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return self.cache[key]
+
+        if key in self.in_flight:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self.in_flight[key])
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.run_in_executor(self.executor, self.compute, path, params)
+        self.in_flight[key] = future
+        self.stats["computed"] += 1
+        try:
+            response: tuple[bytes, str] = await future
+        finally:
+            del self.in_flight[key]
+
+        self.cache[key] = response
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return response
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serves the HTTP/1.1 requests of one connection (keep-alive)"""
+
+        try:
+            while True:
+                request_line: bytes = await reader.readline()
+                if not request_line:
+                    break
+                headers: dict[str, str] = {}
+                while True:
+                    line: bytes = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                status, body, content_type = await self.respond(method, target)
+
+                keep_alive: bool = headers.get("connection", "").lower() != "close"
+                writer.write((f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                              f"Content-Type: {content_type}\r\n"
+                              f"Content-Length: {len(body)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method: str, target: str) -> tuple[int, bytes, str]:
+        """Maps a request to its status code and response"""
+
+        if method != "GET":
+            return 405, b"", "text/plain"
+
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, json.dumps(self.stats).encode("utf8"), "application/json"
+
+        if url.path not in ENDPOINTS:
+            return 404, b"Not found", "text/plain"
+
+        try:
+            body, content_type = await self.query(url.path, parse_qs(url.query))
+        except ValueError as error:
+            return 400, str(error).encode("utf8"), "text/plain"
+        except Exception as error:
+            return 500, str(error).encode("utf8"), "text/plain"
+
+        return 200, body, content_type
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8000, cache_size: int = 256, workers: int = 4) -> None:
+    """Loads the aggregates and serves until interrupted
+
+    Args:
+        host (str, optional): interface to bind. Defaults to "127.0.0.1".
+        port (int, optional): TCP port. Defaults to 8000.
+        cache_size (int, optional): responses kept in the LRU cache. Defaults to 256.
+        workers (int, optional): threads for the pandas work. Defaults to 4.
+    """
+
+    service: QueryService = QueryService(load_aggregates(), cache_size, workers)
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"# Serving on http://{host}:{port}")
+
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__" :
+
+    parser = ArgumentParser(description="Mortality query service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cache-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, args.cache_size, args.workers))
@@ -0,0 +1,205 @@
+from pandas import DataFrame, read_csv
+from pathlib import Path
+import numpy as np
+
+
+def get_rate_matrix(deaths_file: str, population_file: str, catalogue_file: str, years: tuple[int, ...] = (2020, 2021)) -> DataFrame:
+    """Builds the region x week mortality rate matrix from the clean data
+
+    Args:
+        deaths_file (str): The file containing the deaths related data
+        population_file (str): The file containing the corresponding population data
+        catalogue_file (str): The file containing the corresponding regions catalogue
+        years (tuple[int, ...], optional): years to keep. Defaults to (2020, 2021).
+
+    Returns:
+        rate_matrix (DataFrame): one row per NUTS-3 region (indexed by nuts3_label), one column per year_week,
+        with the weekly mortality rate by 1000 inhabitants
+    """
+
+    base_path: Path = Path(__file__).parent
+    deaths: DataFrame = read_csv(base_path/"clean_data"/deaths_file, index_col=None)
+    population: DataFrame = read_csv(base_path/"clean_data"/population_file, index_col=None)
+    catalogue: DataFrame = read_csv(base_path/"clean_data"/catalogue_file, index_col=None)
+
+    print("# Aggregating deaths and population by region...")
+    deaths = deaths[(deaths["week"] != 99) & deaths["year"].isin(years)]
+    deaths_by_week: DataFrame = deaths.groupby(["nuts", "year", "year_week"]).agg({"deaths": "sum"}).reset_index()
+    population_by_year: DataFrame = population.groupby(["nuts", "year"]).agg({"population": "sum"}).reset_index()
+
+    rates: DataFrame = deaths_by_week.merge(population_by_year, how="inner", on=["nuts", "year"])
+    rates["mortality_rate"] = (rates["deaths"] / rates["population"]) * 1000
+
+    print("# Pivoting to region x week matrix...")
+    rate_matrix: DataFrame = rates.pivot(index="nuts", columns="year_week", values="mortality_rate")
+    # Weeks missing for a region are treated as 0 deaths, not dropped, so all the curves share the same axis
+    rate_matrix = rate_matrix.fillna(0.0).sort_index(axis=1)
+
+    labels: DataFrame = catalogue[["nuts3_code", "nuts3_label"]].set_index("nuts3_code")
+    rate_matrix.index = labels["nuts3_label"].reindex(rate_matrix.index).fillna(rate_matrix.index.to_series()).values
+    rate_matrix.index.name = "nuts3_label"
+
+    return rate_matrix
+
+
+def _chunk_rows(n_cols: int, memory_budget_mb: float) -> int:
+    """Number of rows of the output matrix that fit in the memory budget (float64)"""
+
+    return max(1, int(memory_budget_mb * 1024 * 1024 // (8 * max(n_cols, 1))))
+
+
+def _iter_blocks(values: np.ndarray, metric: str, memory_budget_mb: float):
+    """Yields (start, stop, block) where block is the rows [start:stop) of the pairwise matrix
+
+    Correlation is computed as the dot product of the z-scored curves and euclidean distance as
+    |a|^2 + |b|^2 - 2ab, so each block is a single BLAS matrix product.
+    """
+
+    n_rows: int = values.shape[0]
+
+    if metric == "correlation":
+        centered: np.ndarray = values - values.mean(axis=1, keepdims=True)
+        norms: np.ndarray = np.linalg.norm(centered, axis=1, keepdims=True)
+        # Flat curves have no defined correlation; leave them as zeros so they don't match anything
+        norms[norms == 0] = 1.0
+        scaled: np.ndarray = centered / norms
+    elif metric == "euclidean":
+        scaled = values
+        squared_norms: np.ndarray = np.einsum("ij,ij->i", values, values)
+    else:
+        raise ValueError(f"Unknown metric '{metric}', use 'correlation' or 'euclidean'")
+
+    step: int = _chunk_rows(n_rows, memory_budget_mb)
+
+    for start in range(0, n_rows, step):
+        stop: int = min(start + step, n_rows)
+        block: np.ndarray = scaled[start:stop] @ scaled.T
+
+        if metric == "euclidean":
+            block = squared_norms[start:stop, None] + squared_norms[None, :] - 2 * block
+            np.maximum(block, 0, out=block)
+            np.sqrt(block, out=block)
+
+        yield start, stop, block
+
+
+def get_similarity_matrix(rate_matrix: DataFrame, metric: str = "correlation", memory_budget_mb: float = 256) -> DataFrame:
+    """Computes the full pairwise correlation or euclidean distance matrix between the region curves
+
+    Args:
+        rate_matrix (DataFrame): region x week matrix, see get_rate_matrix
+        metric (str, optional): 'correlation' or 'euclidean'. Defaults to "correlation".
+        memory_budget_mb (float, optional): maximum size of each intermediate block. Defaults to 256.
+
+    Returns:
+        similarity (DataFrame): square region x region matrix labelled on both axes
+    """
+
+    values: np.ndarray = rate_matrix.to_numpy(dtype=np.float64)
+    n_rows: int = values.shape[0]
+    result: np.ndarray = np.empty((n_rows, n_rows), dtype=np.float64)
+
+    print(f"# Computing {metric} matrix for {n_rows} regions...")
+    for start, stop, block in _iter_blocks(values, metric, memory_budget_mb):
+        result[start:stop] = block
+
+    similarity: DataFrame = DataFrame(result, index=rate_matrix.index, columns=rate_matrix.index)
+
+    return similarity
+
+
+def get_nearest_regions(rate_matrix: DataFrame, k: int = 5, metric: str = "correlation", memory_budget_mb: float = 256) -> DataFrame:
+    """Finds the k most similar regions of every region without materializing the full matrix
+
+    Args:
+        rate_matrix (DataFrame): region x week matrix, see get_rate_matrix
+        k (int, optional): number of neighbours per region. Defaults to 5.
+        metric (str, optional): 'correlation' or 'euclidean'. Defaults to "correlation".
+        memory_budget_mb (float, optional): maximum size of each intermediate block. Defaults to 256.
+
+    Returns:
+        neighbours (DataFrame): long table with nuts3_label, neighbour_label, rank and score
+    """
+
+    values: np.ndarray = rate_matrix.to_numpy(dtype=np.float64)
+    labels: np.ndarray = rate_matrix.index.to_numpy()
+    n_rows: int = values.shape[0]
+    k = min(k, n_rows - 1)
+
+    region_idx: list[np.ndarray] = []
+    neighbour_idx: list[np.ndarray] = []
+    scores: list[np.ndarray] = []
+
+    print(f"# Searching {k} nearest regions by {metric}...")
+    for start, stop, block in _iter_blocks(values, metric, memory_budget_mb):
+        # Higher correlation is closer, lower distance is closer: work always with "smaller is closer"
+        keys: np.ndarray = -block if metric == "correlation" else block
+        rows: np.ndarray = np.arange(stop - start)
+        keys[rows, rows + start] = np.inf
+
+        top: np.ndarray = np.argpartition(keys, k - 1, axis=1)[:, :k]
+        order: np.ndarray = np.argsort(np.take_along_axis(keys, top, axis=1), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+
+        region_idx.append(np.repeat(np.arange(start, stop), k))
+        neighbour_idx.append(top.ravel())
+        scores.append(np.take_along_axis(block, top, axis=1).ravel())
+
+    regions: np.ndarray = np.concatenate(region_idx)
+    neighbours: DataFrame = DataFrame({
+        "nuts3_label": labels[regions],
+        "neighbour_label": labels[np.concatenate(neighbour_idx)],
+        "rank": np.tile(np.arange(1, k + 1), n_rows),
+        metric: np.concatenate(scores),
+    })
+
+    return neighbours
+
+
+def get_region_clusters(rate_matrix: DataFrame, n_clusters: int = 8, metric: str = "correlation", method: str = "average", memory_budget_mb: float = 256) -> DataFrame:
+    """Groups the regions in hierarchical clusters by the shape of their mortality curves
+
+    Args:
+        rate_matrix (DataFrame): region x week matrix, see get_rate_matrix
+        n_clusters (int, optional): number of flat clusters to cut the tree into. Defaults to 8.
+        metric (str, optional): 'correlation' or 'euclidean'. Defaults to "correlation".
+        method (str, optional): scipy linkage method. Defaults to "average".
+        memory_budget_mb (float, optional): maximum size of each intermediate block. Defaults to 256.
+
+    Returns:
+        clusters (DataFrame): nuts3_label and its cluster number
+    """
+
+    from scipy.cluster.hierarchy import fcluster, linkage
+
+    values: np.ndarray = rate_matrix.to_numpy(dtype=np.float64)
+    n_rows: int = values.shape[0]
+
+    # Condensed distance vector (upper triangle) filled block by block
+    condensed: np.ndarray = np.empty(n_rows * (n_rows - 1) // 2, dtype=np.float64)
+    offset: int = 0
+    for start, stop, block in _iter_blocks(values, metric, memory_budget_mb):
+        if metric == "correlation":
+            block = 1 - block
+        for row in range(start, stop):
+            upper: np.ndarray = block[row - start, row + 1:]
+            condensed[offset:offset + len(upper)] = upper
+            offset += len(upper)
+
+    np.maximum(condensed, 0, out=condensed)
+
+    print(f"# Building {method} linkage tree...")
+    tree: np.ndarray = linkage(condensed, method=method)
+    clusters: DataFrame = DataFrame({
+        "nuts3_label": rate_matrix.index,
+        "cluster": fcluster(tree, t=n_clusters, criterion="maxclust"),
+    })
+
+    return clusters
+
+
+if __name__ == "__main__" :
+
+    rate_matrix = get_rate_matrix("deaths_clean.csv", "population_clean.csv", "nuts3_clean.csv")
+    print(get_nearest_regions(rate_matrix, k=5))
+    print(get_region_clusters(rate_matrix, n_clusters=8))
@@ -0,0 +1,184 @@
+"""Mergeable streaming sketches: KLL for quantiles and HyperLogLog for distinct counts
+
+Both can be built per chunk or per partition and merged afterwards, with memory that does not
+depend on the number of values seen.
+
+Error bounds:
+    KLLSketch(k): normalized rank error of about 1.65% for k=200 with 99% confidence (it scales as
+        ~1/k), i.e. the value returned for q=0.5 has a true rank between 0.4835 and 0.5165. It keeps
+        about 3k values.
+    HyperLogLog(p): relative standard error of 1.04 / sqrt(2^p), 0.81% for p=14, using 2^p bytes.
+"""
+from pandas import Series
+from pandas.util import hash_array
+import numpy as np
+
+
+class KLLSketch:
+    """KLL quantile sketch over float values
+
+    Level h holds values that stand for 2^h original values each. When a level goes over its
+    capacity it is sorted and every other value (random offset) moves up one level.
+    """
+
+    def __init__(self, k: int = 200, c: float = 2 / 3, seed: int = None):
+        self.k: int = k
+        self.c: float = c
+        self.n: int = 0
+        self.levels: list[np.ndarray] = [np.empty(0, dtype=np.float64)]
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        """Capacity of a level: k at the top, shrinking geometrically towards level 0"""
+
+        depth: int = len(self.levels) - level - 1
+
+        return max(int(np.ceil(self.k * self.c ** depth)), 2)
+
+    def _compress(self) -> None:
+        """Compacts the lowest full level until every level is within its capacity"""
+
+        while True:
+            full: list[int] = [level for level, items in enumerate(self.levels) if len(items) > self._capacity(level)]
+            if not full:
+                return
+            level: int = full[0]
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0, dtype=np.float64))
+
+            items: np.ndarray = np.sort(self.levels[level])
+            # With an odd count one value stays behind so the total weight is preserved
+            leftover: np.ndarray = items[-1:] if len(items) % 2 else items[:0]
+            items = items[:len(items) - len(leftover)]
+            promoted: np.ndarray = items[self.rng.integers(2)::2]
+
+            self.levels[level] = leftover
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def update(self, values) -> "KLLSketch":
+        """Adds a batch of values (NaN are ignored)
+
+        Args:
+            values (array-like): values to add
+
+        Returns:
+            self (KLLSketch): the updated sketch
+        """
+
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Adds the values summarized by another sketch
+
+        Args:
+            other (KLLSketch): sketch built on another chunk or partition
+
+        Returns:
+            self (KLLSketch): the merged sketch
+        """
+
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+
+        return self
+
+    def quantiles(self, qs) -> np.ndarray:
+        """Approximate quantiles of every value added
+
+        Args:
+            qs (array-like): probabilities between 0 and 1
+
+        Returns:
+            values (np.ndarray): one value per probability, NaN if the sketch is empty
+        """
+
+        qs = np.asarray(qs, dtype=np.float64)
+        if self.n == 0:
+            return np.full(qs.shape, np.nan)
+
+        items: np.ndarray = np.concatenate(self.levels)
+        weights: np.ndarray = np.concatenate([np.full(len(level_items), 2 ** level, dtype=np.float64)
+                                              for level, level_items in enumerate(self.levels)])
+        order: np.ndarray = np.argsort(items, kind="stable")
+        cumulative: np.ndarray = np.cumsum(weights[order])
+        positions: np.ndarray = np.searchsorted(cumulative, qs * cumulative[-1], side="left")
+
+        return items[order][np.minimum(positions, len(items) - 1)]
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter over any hashable values (strings, numbers)"""
+
+    def __init__(self, p: int = 14):
+        self.p: int = p
+        self.registers: np.ndarray = np.zeros(2 ** p, dtype=np.uint8)
+
+    def update(self, values) -> "HyperLogLog":
+        """Adds a batch of values
+
+        Args:
+            values (array-like): values to count
+
+        Returns:
+            self (HyperLogLog): the updated counter
+        """
+
+        hashes: np.ndarray = hash_array(Series(values).to_numpy())
+        index: np.ndarray = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest: np.ndarray = hashes << np.uint64(self.p)
+
+        # Leading zeros of the remaining bits, by halving the search window (exact, no float rounding)
+        zeros: np.ndarray = np.zeros(len(rest), dtype=np.uint8)
+        for shift in (32, 16, 8, 4, 2, 1):
+            empty: np.ndarray = (rest >> np.uint64(64 - shift)) == 0
+            zeros[empty] += shift
+            rest[empty] <<= np.uint64(shift)
+        rank: np.ndarray = np.minimum(zeros, 64 - self.p) + 1
+
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Adds the values counted by another counter with the same p
+
+        Args:
+            other (HyperLogLog): counter built on another chunk or partition
+
+        Returns:
+            self (HyperLogLog): the merged counter
+        """
+
+        if other.p != self.p:
+            raise ValueError(f"Cannot merge HyperLogLog with p={other.p} into p={self.p}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+        return self
+
+    def count(self) -> float:
+        """Estimated number of distinct values added
+
+        Returns:
+            estimate (float): the cardinality estimate
+        """
+
+        m: int = len(self.registers)
+        alpha: float = 0.7213 / (1 + 1.079 / m)
+        estimate: float = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+
+        # Small range correction (linear counting) while many registers are still empty
+        empty_registers: int = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and empty_registers > 0:
+            estimate = m * np.log(m / empty_registers)
+
+        return float(estimate)
@@ -0,0 +1,259 @@
+from pandas import DataFrame, read_sql_query
+from pathlib import Path
+import csv
+import gzip
+import sqlite3
+
+# Table layout of the store: column name -> SQLite type. Column order follows the clean CSV files.
+TABLES: dict[str, dict[str, str]] = {
+    "deaths": {"sex": "TEXT", "age": "TEXT", "nuts": "TEXT", "year_week": "TEXT", "deaths": "INTEGER",
+               "is_provisional": "INTEGER", "year": "INTEGER", "week": "INTEGER"},
+    "population": {"sex": "TEXT", "age": "TEXT", "nuts": "TEXT", "year": "INTEGER", "population": "REAL",
+                   "is_provisional": "INTEGER"},
+    "nuts3": {"nuts3_code": "TEXT", "nuts2_code": "TEXT", "nuts1_code": "TEXT", "country_code": "TEXT",
+              "nuts3_label": "TEXT", "nuts2_label": "TEXT", "nuts1_label": "TEXT", "country_label": "TEXT"},
+}
+
+INDEXES: dict[str, list[list[str]]] = {
+    "deaths": [["nuts", "year", "week"], ["year", "sex", "age"]],
+    "population": [["nuts", "year"], ["year", "sex", "age"]],
+    "nuts3": [["nuts3_code"]],
+}
+
+
+def get_database_path(database: str = "mortality.db") -> Path:
+    """Location of the SQLite store, next to the results
+
+    Args:
+        database (str, optional): database file name. Defaults to "mortality.db".
+
+    Returns:
+        database_path (Path): path inside the results folder
+    """
+
+    return Path(__file__).parent/"results"/database
+
+
+def _convert(value: str, sql_type: str):
+    """Parses a CSV field to the Python value stored in a column of the given type"""
+
+    if value == "":
+        return None
+    if value in ("True", "False"):
+        return int(value == "True")
+    if sql_type == "INTEGER":
+        return int(float(value))
+    if sql_type == "REAL":
+        return float(value)
+    return value
+
+
+def load_table(connection: sqlite3.Connection, table: str, file_path: Path, batch_size: int = 50_000) -> int:
+    """Streams a clean CSV file into a table with executemany, one transaction per batch
+
+    Args:
+        connection (sqlite3.Connection): open connection to the store
+        table (str): target table, one of TABLES
+        file_path (Path): CSV file, plain or gzip
+        batch_size (int, optional): rows inserted per transaction. Defaults to 50_000.
+
+    Returns:
+        n_rows (int): number of rows loaded
+    """
+
+    columns: dict[str, str] = TABLES[table]
+    # Some stage files are gzip even with a .csv extension: look at the magic number instead
+    with open(file_path, "rb") as file:
+        is_gzip: bool = file.read(2) == b"\x1f\x8b"
+    opener = gzip.open if is_gzip else open
+
+    insert: str = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    n_rows: int = 0
+
+    with opener(file_path, "rt", encoding="utf8", newline="") as file:
+        reader = csv.DictReader(file)
+        batch: list[tuple] = []
+        for row in reader:
+            batch.append(tuple(_convert(row[column], sql_type) for column, sql_type in columns.items()))
+            if len(batch) == batch_size:
+                with connection:
+                    connection.executemany(insert, batch)
+                n_rows += len(batch)
+                batch = []
+        if batch:
+            with connection:
+                connection.executemany(insert, batch)
+            n_rows += len(batch)
+
+    return n_rows
+
+
+def export_to_sqlite(deaths_file: str = "deaths_clean.csv", population_file: str = "population_clean.csv", catalogue_file: str = "nuts3_clean.csv", database: str = "mortality.db") -> None:
+    """Exports the clean deaths, population and NUTS catalogue to an indexed SQLite database
+
+    The tables are recreated from scratch and the indexes are built after the bulk load, which is
+    much faster than keeping them up to date row by row.
+
+    Args:
+        deaths_file (str, optional): deaths file in clean_data. Defaults to "deaths_clean.csv".
+        population_file (str, optional): population file in clean_data. Defaults to "population_clean.csv".
+        catalogue_file (str, optional): NUTS-3 catalogue file in clean_data. Defaults to "nuts3_clean.csv".
+        database (str, optional): database file name in results. Defaults to "mortality.db".
+    """
+
+    print("-"*20)
+
+    base_path: Path = Path(__file__).parent
+    database_path: Path = get_database_path(database)
+    files: dict[str, str] = {"deaths": deaths_file, "population": population_file, "nuts3": catalogue_file}
+
+    connection: sqlite3.Connection = sqlite3.connect(database_path)
+    try:
+        # The store is rebuilt from the CSV files, so durability during the load is not needed
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+
+        for table, file_name in files.items():
+            print(f"# Loading {file_name} into '{table}'...")
+            columns: str = ", ".join(f"{column} {sql_type}" for column, sql_type in TABLES[table].items())
+            with connection:
+                connection.execute(f"DROP TABLE IF EXISTS {table}")
+                connection.execute(f"CREATE TABLE {table} ({columns})")
+
+            n_rows: int = load_table(connection, table, base_path/"clean_data"/file_name)
+            print(f"# {n_rows} rows loaded")
+
+            print(f"# Indexing '{table}'...")
+            with connection:
+                for index_columns in INDEXES[table]:
+                    connection.execute(f"CREATE INDEX idx_{table}_{'_'.join(index_columns)} ON {table} ({', '.join(index_columns)})")
+
+        with connection:
+            connection.execute("ANALYZE")
+    finally:
+        connection.close()
+
+    print(f"# {database_path.name} exported!")
+
+
+def query(sql: str, params: tuple = (), database: str = "mortality.db") -> DataFrame:
+    """Runs a query against the store and returns its (small) result as a DataFrame
+
+    Args:
+        sql (str): SQL query with '?' placeholders
+        params (tuple, optional): placeholder values. Defaults to ().
+        database (str, optional): database file name in results. Defaults to "mortality.db".
+
+    Returns:
+        result (DataFrame): the query result
+    """
+
+    connection: sqlite3.Connection = sqlite3.connect(get_database_path(database))
+    try:
+        result: DataFrame = read_sql_query(sql, connection, params=params)
+    finally:
+        connection.close()
+
+    return result
+
+
+def get_top_deaths_by_city(by_column: str, year: int = 2021, limit: int = 10, database: str = "mortality.db") -> DataFrame:
+    """SQL version of ex5.get_top_deaths_by_city: the ranking is computed by SQLite
+
+    Args:
+        by_column (str): column to group by, from the deaths table or the NUTS-3 catalogue
+        year (int, optional): year to rank. Defaults to 2021.
+        limit (int, optional): number of rows returned. Defaults to 10.
+        database (str, optional): database file name in results. Defaults to "mortality.db".
+
+    Returns:
+        top_deaths (DataFrame): by_column and deaths, sorted by deaths
+    """
+
+    # Column names can't be placeholders: only accept the known ones. Rows without a value of the
+    # column are left out, like pandas' groupby does in ex5
+    if by_column in TABLES["nuts3"]:
+        column: str = f"c.{by_column}"
+    elif by_column in TABLES["deaths"]:
+        column = f"d.{by_column}"
+    else:
+        raise ValueError(f"Unknown column '{by_column}'")
+
+    sql: str = f"""
+        SELECT {column} AS {by_column}, SUM(d.deaths) AS deaths
+        FROM deaths d LEFT JOIN nuts3 c ON d.nuts = c.nuts3_code
+        WHERE d.year = ? AND {column} IS NOT NULL
+        GROUP BY {column}
+        ORDER BY deaths DESC
+        LIMIT ?
+    """
+    top_deaths: DataFrame = query(sql, (year, limit), database)
+
+    return top_deaths
+
+
+def get_mortality_rate(year: int = 2021, database: str = "mortality.db") -> DataFrame:
+    """SQL version of ex6.get_mortality_rate: aggregation and join run in SQLite
+
+    Args:
+        year (int, optional): year of the rates. Defaults to 2021.
+        database (str, optional): database file name in results. Defaults to "mortality.db".
+
+    Returns:
+        mortality_rate_by_region (DataFrame): nuts3_label, mortality_rate, deaths and population
+    """
+
+    sql: str = """
+        WITH d AS (SELECT nuts, SUM(deaths) AS deaths FROM deaths WHERE year = ? GROUP BY nuts),
+             p AS (SELECT nuts, SUM(population) AS population FROM population WHERE year = ? GROUP BY nuts)
+        SELECT c.nuts3_label,
+               d.deaths * 1000.0 / p.population AS mortality_rate,
+               d.deaths,
+               p.population
+        FROM d
+        LEFT JOIN p ON d.nuts = p.nuts
+        LEFT JOIN nuts3 c ON d.nuts = c.nuts3_code
+    """
+    mortality_rate_by_region: DataFrame = query(sql, (year, year), database)
+
+    return mortality_rate_by_region
+
+
+def get_deaths_by_week(database: str = "mortality.db") -> DataFrame:
+    """SQL version of ex8.get_deaths_by_week: weekly deaths and yearly population by country
+
+    Regions missing from the catalogue have no country and are left out, like in the pandas version.
+
+    Args:
+        database (str, optional): database file name in results. Defaults to "mortality.db".
+
+    Returns:
+        deaths_population (DataFrame): country_label, year_week, year, deaths, population and mortality_rate
+    """
+
+    sql: str = """
+        WITH d AS (
+            SELECT c.country_label, d.year_week, d.year, SUM(d.deaths) AS deaths
+            FROM deaths d LEFT JOIN nuts3 c ON d.nuts = c.nuts3_code
+            WHERE d.week != 99 AND c.country_label IS NOT NULL
+            GROUP BY c.country_label, d.year_week, d.year
+        ), p AS (
+            SELECT c.country_label, p.year, SUM(p.population) AS population
+            FROM population p LEFT JOIN nuts3 c ON p.nuts = c.nuts3_code
+            WHERE c.country_label IS NOT NULL
+            GROUP BY c.country_label, p.year
+        )
+        SELECT d.country_label, d.year_week, d.year, d.deaths, p.population,
+               d.deaths * 1000.0 / p.population AS mortality_rate
+        FROM d LEFT JOIN p ON d.country_label IS p.country_label AND d.year = p.year
+        ORDER BY d.country_label, d.year_week
+    """
+    deaths_population: DataFrame = query(sql, (), database)
+
+    return deaths_population
+
+
+if __name__ == "__main__" :
+
+    export_to_sqlite()
+    print(get_top_deaths_by_city("nuts3_label"))
@@ -0,0 +1,71 @@
+from pandas import DataFrame, Index, Series
+import pytest
+
+pytest.importorskip("scipy")
+
+from nuts_recode import get_target_weights, recode_regions
+
+
+def make_deaths() -> DataFrame:
+    """Clean deaths with one split region (XX001), two merged ones (XX002, XX003) and an unknown one (XX009)"""
+
+    return DataFrame({
+        "sex": ["F", "F", "F", "F", "M"],
+        "age": ["Y10-14"] * 5,
+        "nuts": ["XX001", "XX002", "XX003", "XX009", "YY001"],
+        "year_week": ["2021W01"] * 5,
+        "deaths": [10.0, 3.0, 4.0, 5.0, 0.0],
+        "is_provisional": [False, True, False, False, False],
+        "year": [2021] * 5,
+        "week": [1] * 5,
+    })
+
+
+def test_recode_regions_keeps_column_names_and_values():
+    changes = DataFrame({"source_code": ["XX001", "XX001", "XX002", "XX003"],
+                         "target_code": ["XX011", "XX012", "XX023", "XX023"]})
+    target_codes = Index(["XX011", "XX012", "XX023", "YY001"])
+    weights = Series({"XX011": 3.0, "XX012": 1.0})
+
+    recoded, unmapped = recode_regions(make_deaths(), ["deaths"], changes, target_codes, weights, source_countries=["XX"])
+
+    assert list(recoded.columns) == list(make_deaths().columns)
+    deaths = recoded.set_index("nuts")["deaths"]
+    assert deaths["XX011"] == pytest.approx(7.5)
+    assert deaths["XX012"] == pytest.approx(2.5)
+    assert deaths["XX023"] == pytest.approx(7.0)
+    # Zero values are kept, not dropped by the sparse product
+    assert deaths["YY001"] == 0.0
+    assert bool(recoded.set_index("nuts").loc["XX023", "is_provisional"])
+    assert (recoded["sex"] == "F").sum() == 3
+    assert list(unmapped["nuts"]) == ["XX009"]
+    assert unmapped["deaths"].tolist() == [5.0]
+
+
+def test_split_without_target_population_falls_back_to_equal_shares():
+    changes = DataFrame({"source_code": ["XX001", "XX001", "XX002", "XX003"],
+                         "target_code": ["XX011", "XX012", "XX023", "XX023"]})
+    target_codes = Index(["XX011", "XX012", "XX023", "YY001"])
+    # XX still reports NUTS 2016, so its population has no XX011/XX012 rows
+    population = DataFrame({"nuts": ["XX001", "XX002", "YY001"], "population": [4000.0, 1000.0, 500.0]})
+
+    weights = get_target_weights(population, changes, target_codes)
+    recoded, _ = recode_regions(make_deaths(), ["deaths"], changes, target_codes, weights, source_countries=["XX"])
+
+    assert list(weights.index) == ["YY001"]
+    deaths = recoded.set_index("nuts")["deaths"]
+    assert deaths["XX011"] == pytest.approx(5.0)
+    assert deaths["XX012"] == pytest.approx(5.0)
+    assert deaths["XX023"] == pytest.approx(7.0)
+
+
+def test_target_weights_skip_source_version_countries():
+    changes = DataFrame({"source_code": ["XX001", "XX001", "YY001"], "target_code": ["XX011", "XX012", "YY002"]})
+    target_codes = Index(["XX011", "XX012", "XX020", "YY002", "YY003"])
+    # XX reports NUTS 2021; YY reports NUTS 2016, even for its unchanged code YY003
+    population = DataFrame({"nuts": ["XX011", "XX012", "XX020", "XX020", "YY001", "YY003"],
+                            "population": [300.0, 100.0, 50.0, 25.0, 800.0, 200.0]})
+
+    weights = get_target_weights(population, changes, target_codes)
+
+    assert weights.to_dict() == {"XX011": 300.0, "XX012": 100.0, "XX020": 75.0}
@@ -0,0 +1,34 @@
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
+import numpy as np
+
+from ranking import top_k_by_group, top_k_by_group_chunked
+
+
+def make_regions() -> DataFrame:
+    """Region totals with a missing group key (NaN country) and an index that is not 0..n"""
+
+    return DataFrame({
+        "country": ["A", "A", "A", "B", "B", np.nan, np.nan, np.nan],
+        "region": ["A1", "A2", "A3", "B1", "B2", "N1", "N2", "N3"],
+        "deaths": [5.0, 9.0, 7.0, 1.0, 3.0, 8.0, 2.0, 6.0],
+    }, index=[10, 11, 12, 13, 14, 15, 16, 17])
+
+
+def test_top_k_by_group_keeps_index_labels():
+    top = top_k_by_group(make_regions(), ["country"], "deaths", k=2)
+
+    assert list(top.index) == [11, 12, 14, 13, 15, 17]
+    assert list(top["rank"]) == [1, 2, 1, 2, 1, 2]
+
+
+def test_chunked_matches_in_memory_with_missing_keys():
+    regions = make_regions()
+    chunks = (regions.iloc[start:start + 3] for start in range(0, len(regions), 3))
+
+    chunked = top_k_by_group_chunked(chunks, ["country"], "deaths", k=2)
+    expected = top_k_by_group(regions, ["country"], "deaths", k=2)
+
+    # The NaN keys form a single group, as with groupby(dropna=False)
+    assert chunked["country"].isna().sum() == 2
+    assert_frame_equal(chunked, expected, check_dtype=False)
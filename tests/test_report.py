@@ -0,0 +1,39 @@
+from pandas import DataFrame
+import inspect
+import json
+import numpy as np
+import pytest
+
+pytest.importorskip("matplotlib")
+
+import report
+
+
+def test_weekly_series_is_downsampled():
+    # 2020-2021 weekly series, with a peak that must survive the downsampling
+    x = np.arange(105)
+    y = np.ones(105)
+    y[40] = 10.0
+    max_points: int = inspect.signature(report.render_chart).parameters["max_points"].default
+
+    keep = report.downsample_lttb(x, y, max_points)
+
+    assert len(keep) == max_points < len(x)
+    assert keep[0] == 0 and keep[-1] == len(x) - 1
+    assert 40 in keep
+    assert (np.diff(keep) > 0).all()
+
+
+def test_manifest_keeps_rendered_charts_when_one_fails(tmp_path):
+    data = DataFrame({"week": range(10), "rate": np.linspace(1, 2, 10)})
+    jobs: list[dict] = [
+        {"name": "good", "data": data, "kind": "line", "x": "week", "y": "rate"},
+        {"name": "bad", "data": data, "kind": "line", "x": "week", "y": "missing"},
+    ]
+
+    with pytest.raises(KeyError):
+        report.render_charts(jobs, str(tmp_path), n_workers=1)
+
+    manifest: dict = json.loads((tmp_path/"manifest.json").read_text())
+    assert list(manifest) == ["good.png"]
+    assert (tmp_path/"good.png").exists()
@@ -0,0 +1,15 @@
+import asyncio
+import pytest
+
+from service import QueryService
+
+
+@pytest.mark.parametrize("k", ["0", "-3", "ten"])
+def test_top_rejects_invalid_k(k):
+    # k is checked before the aggregates are read, so none are needed
+    service = QueryService({})
+
+    status, body, _ = asyncio.run(service.respond("GET", f"/top?k={k}"))
+
+    assert status == 400
+    assert body
@@ -0,0 +1,84 @@
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
+import pytest
+
+import ex5
+import ex8
+import result_cache
+import sql_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Small clean files and their SQLite store in a temporary project folder
+
+    The modules find clean_data and results next to their own file, so their __file__ is pointed at
+    tmp_path. XX999 is missing from the catalogue, so it has no label and no country.
+    """
+
+    for module in (ex5, ex8, sql_store):
+        monkeypatch.setattr(module, "__file__", str(tmp_path/f"{module.__name__}.py"))
+    monkeypatch.setattr(result_cache, "CACHE_DIR", tmp_path/"results"/".cache")
+    (tmp_path/"clean_data").mkdir()
+    (tmp_path/"results").mkdir()
+    files: dict[str, str] = {"deaths": "deaths_clean.csv", "population": "population_clean.csv", "nuts3": "nuts3_clean.csv"}
+
+    DataFrame({
+        "sex": ["F", "M", "F", "F", "M", "F", "F"],
+        "age": ["Y10-14"] * 7,
+        "nuts": ["XX001", "XX001", "XX002", "YY001", "YY001", "XX999", "XX002"],
+        "year_week": ["2021W01", "2021W01", "2021W02", "2021W01", "2021W02", "2021W01", "2021W99"],
+        "deaths": [5, 6, 2, 9, 1, 40, 3],
+        "is_provisional": [False] * 7,
+        "year": [2021] * 7,
+        "week": [1, 1, 2, 1, 2, 1, 99],
+    }).to_csv(tmp_path/"clean_data"/files["deaths"], index=False)
+    DataFrame({
+        "sex": ["F", "F", "F", "F"],
+        "age": ["Y10-14"] * 4,
+        "nuts": ["XX001", "XX002", "YY001", "XX999"],
+        "year": [2021] * 4,
+        "population": [1000.0, 2000.0, 1500.0, 500.0],
+        "is_provisional": [False] * 4,
+    }).to_csv(tmp_path/"clean_data"/files["population"], index=False)
+    DataFrame({
+        "nuts3_code": ["XX001", "XX002", "YY001"], "nuts2_code": ["XX00", "XX00", "YY00"],
+        "nuts1_code": ["XX0", "XX0", "YY0"], "country_code": ["XX", "XX", "YY"],
+        "nuts3_label": ["Alpha", "Beta", "Gamma"], "nuts2_label": ["A", "A", "G"],
+        "nuts1_label": ["A", "A", "G"], "country_label": ["Xland", "Xland", "Yland"],
+    }).to_csv(tmp_path/"clean_data"/files["nuts3"], index=False)
+
+    database: str = "mortality.db"
+    sql_store.export_to_sqlite(files["deaths"], files["population"], files["nuts3"], database)
+    assert (tmp_path/"results"/database).exists()
+
+    return files, database
+
+
+def test_top_deaths_backends_match(store):
+    files, database = store
+
+    expected: DataFrame = ex5.get_top_deaths_by_city(files["deaths"], files["nuts3"], "nuts3_label")
+    result: DataFrame = ex5.get_top_deaths_by_city(files["deaths"], files["nuts3"], "nuts3_label", backend="sqlite", database=database)
+
+    assert result["nuts3_label"].notna().all()
+    assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False)
+
+
+def test_deaths_by_week_backends_match(store):
+    files, database = store
+    columns: list[str] = ["country_label", "year_week", "year", "deaths", "population", "mortality_rate"]
+
+    expected: DataFrame = ex8.get_deaths_by_week(files["deaths"], files["nuts3"], files["population"])
+    result: DataFrame = ex8.get_deaths_by_week(files["deaths"], files["nuts3"], files["population"], backend="sqlite", database=database)
+
+    expected = expected[columns].sort_values(["country_label", "year_week"]).reset_index(drop=True)
+    result = result[columns].sort_values(["country_label", "year_week"]).reset_index(drop=True)
+    assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_unknown_backend_raises(store):
+    files, _ = store
+
+    with pytest.raises(ValueError):
+        ex5.get_top_deaths_by_city(files["deaths"], files["nuts3"], "nuts3_label", backend="duckdb")